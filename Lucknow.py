@@ -1,671 +1,2868 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import numpy as np
 import pandas as pd
+import openpyxl
+import argparse
+import collections
+import contextlib
+import datetime
+import functools
+import hashlib
+import http.server
 import io
+import itertools
+import json
+import logging
+import multiprocessing
+import operator
+import os
+import sqlite3
+import sys
+import threading
+import time
+import types
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
 
-# Main Category Mapping (exact match)
-MAIN_CATEGORY_MAPPING = {
-    # Sanitation (7 subcategories)
-    "Garbage dumped on public land": "Sanitation",
-    "Overflowing Dustbin": "Sanitation", 
-    "Mud/silt sticking on structures on the roadsides/footpaths/Dividers": "Sanitation",
-    "Burning of Garbage, Plastic, Leaves, Branches etc.": "Sanitation",
-    "Road Dust/Sand Piled on Roadside": "Sanitation",
-    "Road Dust": "Sanitation",
-    "Garbage Burning at roadside": "Sanitation",
-    
-    # Malba (4 subcategories)
-    "Malba, Bricks, Bori, etc on Dumping Land": "Malba",
-    "Construction material lying unattended/encroaching public spaces": "Malba",
-    "Construction and Demolition Activity Without Safeguards": "Malba",
-    "C&D Waste Pick up request": "Malba",
-    
-    # Engineering (4 subcategories)
-    "Pothole": "Engineering",
-    "Unpaved road": "Engineering",
-    "Broken Footpath/ Divider": "Engineering",
-    "End to end pavement required": "Engineering"
-}
+logger = logging.getLogger(__name__)
+
+# Columns the dashboard reads from the complaints export; everything else is skipped at parse time
+REQUIRED_COLUMNS = ['Subcategory', 'Status Name', 'Assigned User Name', 'Zone Name']
+
+# Unique key of a complaint; read when the export has it and used to diff daily exports
+COMPLAINT_ID_COLUMN = 'Complaint ID'
+
+# Date columns a date window can filter on, by basis; read when the export has them
+DATE_COLUMNS = {'Created': 'Created Date', 'Resolved': 'Resolved Date'}
+OPTIONAL_COLUMNS = [COMPLAINT_ID_COLUMN] + list(DATE_COLUMNS.values())
+
+# Export file types the uploaders accept ('gz' covers .csv.gz)
+UPLOAD_TYPES = ['xlsx', 'csv', 'gz']
+
+# Processes that parse a multi-file upload side by side
+UPLOAD_WORKERS = int(os.environ.get('LUCKNOW_UPLOAD_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Rows per chunk in the low-memory streaming mode
+STREAM_CHUNK_ROWS = int(os.environ.get('LUCKNOW_STREAM_CHUNK_ROWS', '50000'))
+
+# On-disk Parquet snapshots of enriched uploads, keyed by the SHA-256 of the file bytes.
+# Bump SNAPSHOT_VERSION whenever the enriched columns or their dtypes change
+# (rule changes are covered by RULES_FINGERPRINT).
+SNAPSHOT_VERSION = 3
+SNAPSHOT_DIR = os.environ.get('LUCKNOW_SNAPSHOT_DIR', '.snapshot_cache')
+SNAPSHOT_MAX_BYTES = int(os.environ.get('LUCKNOW_SNAPSHOT_MAX_MB', '512')) * 1024 * 1024
+
+# Summary results shared by all sessions: least recently used entries are evicted beyond
+# the size cap, and an entry is recomputed once it is older than the TTL
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('LUCKNOW_CACHE_MAX_MB', '256')) * 1024 * 1024
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get('LUCKNOW_CACHE_TTL_MIN', '120')) * 60
+
+# A session that has not rerun for this long no longer keeps its dataset in memory
+DATASET_TTL_SECONDS = int(os.environ.get('LUCKNOW_DATASET_TTL_MIN', '30')) * 60
+
+# Where the per-stage profile is logged as JSON lines: a file path, '-' for stderr (unset: not written)
+PROFILE_LOG = os.environ.get('LUCKNOW_PROFILE_LOG')
+
+# Background threads that fill the summary cache after an upload
+WARMUP_WORKERS = int(os.environ.get('LUCKNOW_WARMUP_WORKERS', '2'))
+
+# JSON API served next to the dashboard when LUCKNOW_API_PORT is set
+API_HOST = os.environ.get('LUCKNOW_API_HOST', '127.0.0.1')
+API_PORT = os.environ.get('LUCKNOW_API_PORT')
+
+# SQLite history of stored exports shown in the dashboard (unset: no history section)
+HISTORY_DB = os.environ.get('LUCKNOW_HISTORY_DB')
+
+# Dimensions of the count cube every summary is rolled up from
+CUBE_DIMENSIONS = ['MainCategory', 'Subcategory', 'Zone Name', 'Department', 'Assigned User Name', 'StatusBinary']
+
+# Category and department rules are read from a JSON config once per process (reruns of
+# `streamlit run` keep the first read); snapshots and reports are keyed by its fingerprint,
+# so an edited config takes effect, with fresh snapshots and reports, after an app restart
+RULES_PATH = os.environ.get(
+    'LUCKNOW_RULES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classification_rules.json')
+)
+# Column each rule set in the config classifies
+RULE_COLUMNS = {'main_category': 'Subcategory', 'department': 'Assigned User Name'}
+
+# ========== PROFILING ==========
+
+# Per-stage timings are also logged here as one JSON object per line
+PROFILE_LOGGER = logging.getLogger('lucknow.profile')
+
+def configure_profile_log(target):
+    """Write PROFILE_LOGGER records (INFO) to target, a file path or '-' for stderr, one message per line"""
+    handler = logging.StreamHandler() if target == '-' else logging.FileHandler(target)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    PROFILE_LOGGER.addHandler(handler)
+    PROFILE_LOGGER.setLevel(logging.INFO)
+    # Keep the JSON lines out of whatever the root logger writes
+    PROFILE_LOGGER.propagate = False
+
+# The logger outlives the reruns of `streamlit run`, which re-execute this module
+if PROFILE_LOG and not PROFILE_LOGGER.handlers:
+    configure_profile_log(PROFILE_LOG)
+
+# Records of code running outside a Streamlit session (CLI, benchmarks, background threads)
+_HEADLESS_PROFILE = collections.deque(maxlen=1000)
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def profile_records():
+    """Profile records of the current rerun, or the headless list outside one (e.g. in warm-up threads).
+
+    In a session the list holds the latest full rerun's records, with those of every
+    section replaced by its own latest run, fragment reruns included.
+    """
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return _HEADLESS_PROFILE
+    return st.session_state.setdefault('_profile_records', [])
+
+def reset_profile():
+    """Start a fresh list of profile records for this (full) rerun"""
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        st.session_state['_profile_records'] = []
+        st.session_state['_profile_section'] = None
+
+@contextlib.contextmanager
+def profile_stage(name, kind='stage'):
+    """Record wall time and RSS delta of the enclosed block; yields the record so callers can add fields"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    record = {
+        'stage': name, 'kind': kind, 'cache': None, 'session': ctx.session_id if ctx else None,
+        'section': st.session_state.get('_profile_section') if ctx else None,
+    }
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        rss_after = current_rss_bytes()
+        record['rss_delta_bytes'] = rss_after - rss_before if None not in (rss_before, rss_after) else None
+        profile_records().append(record)
+        PROFILE_LOGGER.info(json.dumps(record, default=str))
+
+def profiled_section(name):
+    """Profile a dashboard section (a fragment) as kind='section', with every stage it runs.
+
+    The stage is recorded inside the fragment, so a fragment rerun - which skips the
+    rest of the script - replaces that section's records instead of being lost.
+    Apply it under @st.fragment.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if get_script_run_ctx(suppress_warning=True) is None:
+                return func(*args, **kwargs)
+            records = profile_records()
+            records[:] = [record for record in records if record['section'] != name]
+            st.session_state['_profile_section'] = name
+            try:
+                with profile_stage(name, kind='section'):
+                    return func(*args, **kwargs)
+            finally:
+                st.session_state['_profile_section'] = None
+        return wrapper
+    return decorate
+
+# ========== RESULT CACHE ==========
+# Counters kept per cached function
+RESULT_CACHE_COUNTERS = ['hits', 'misses', 'evictions', 'expirations']
+
+def _new_result_cache():
+    return {
+        # (function, key) -> {'value', 'bytes', 'expires', 'datasets'}, least recently used first
+        'entries': collections.OrderedDict(),
+        'bytes': 0,
+        'stats': collections.defaultdict(lambda: dict.fromkeys(RESULT_CACHE_COUNTERS, 0)),
+        'lock': threading.Lock(),
+    }
+
+# Stand-in for code running outside a Streamlit script run (CLI, benchmarks)
+_HEADLESS_RESULT_CACHE = _new_result_cache()
+
+@st.cache_resource
+def _shared_result_cache():
+    return _new_result_cache()
+
+def _result_cache():
+    """Process-wide result cache of the profiled_cache functions, shared by all sessions"""
+    storage = getattr(_BACKGROUND_STORAGE, 'current', None)
+    if storage is not None:
+        return storage['cache']
+    if get_script_run_ctx() is None:
+        return _HEADLESS_RESULT_CACHE
+    return _shared_result_cache()
+
+def _cache_key(value):
+    """Hashable form of call arguments: bytes by content hash, containers as tuples"""
+    if isinstance(value, (bytes, bytearray)):
+        return ('bytes', hashlib.sha256(value).hexdigest())
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted(((key, _cache_key(item)) for key, item in value.items()), key=repr))
+    if isinstance(value, (set, frozenset)):
+        return ('set',) + tuple(sorted(map(_cache_key, value), key=repr))
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_cache_key, value))
+    return value
+
+def result_nbytes(value):
+    """Approximate memory held by a cached result"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(map(result_nbytes, value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(map(result_nbytes, value.values()))
+    return sys.getsizeof(value)
+
+def _copy_result(value):
+    """Copy of a cached result that callers may modify (frames are the only mutable results)"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, (list, tuple)):
+        return type(value)(map(_copy_result, value))
+    return value
+
+def _drop_entry(cache, entry_key, counter=None):
+    entry = cache['entries'].pop(entry_key)
+    cache['bytes'] -= entry['bytes']
+    if counter:
+        cache['stats'][entry_key[0]][counter] += 1
+
+def code_fingerprint(code):
+    """Hash of a code object's bytecode, names and constants, nested functions included.
+
+    The bytecode alone refers to constants and names by position, so editing a literal
+    or the function called would not change it.
+    """
+    digest = hashlib.sha256(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        digest.update(code_fingerprint(const).encode() if isinstance(const, types.CodeType) else repr(const).encode())
+    return digest.hexdigest()[:12]
+
+def _cache_get(cache, name, key):
+    """(True, value) of a live entry, counted as a hit; (False, None) counted as a miss"""
+    entry_key = (name, key)
+    with cache['lock']:
+        entry = cache['entries'].get(entry_key)
+        if entry is not None and entry['expires'] <= time.monotonic():
+            _drop_entry(cache, entry_key, 'expirations')
+            entry = None
+        if entry is None:
+            cache['stats'][name]['misses'] += 1
+            return False, None
+        cache['entries'].move_to_end(entry_key)
+        cache['stats'][name]['hits'] += 1
+        return True, entry['value']
+
+def _cache_put(cache, name, key, value, ttl, max_entries=None, datasets=(), max_bytes=RESULT_CACHE_MAX_BYTES):
+    """Store a result, then drop expired entries and evict least recently used ones over the limits"""
+    nbytes = result_nbytes(value)
+    entry_key = (name, key)
+    now = time.monotonic()
+    with cache['lock']:
+        entries = cache['entries']
+        if entry_key in entries:
+            _drop_entry(cache, entry_key)
+        for expired in [other for other, entry in entries.items() if entry['expires'] <= now]:
+            _drop_entry(cache, expired, 'expirations')
+        if nbytes > max_bytes:
+            # Would evict everything else and still not fit
+            return
+        
+        entries[entry_key] = {'value': value, 'bytes': nbytes, 'expires': now + ttl, 'datasets': set(datasets)}
+        cache['bytes'] += nbytes
+        if max_entries:
+            own = [other for other in entries if other[0] == name]
+            for evicted in own[:len(own) - max_entries]:
+                _drop_entry(cache, evicted, 'evictions')
+        while cache['bytes'] > max_bytes:
+            _drop_entry(cache, next(iter(entries)), 'evictions')
+
+def clear_cached_results(name=None, dataset_id=None):
+    """Drop the cached results of one function and/or one dataset (everything when neither is given)"""
+    cache = _result_cache()
+    with cache['lock']:
+        for entry_key in [
+            entry_key for entry_key, entry in cache['entries'].items()
+            if name in (None, entry_key[0]) and dataset_id in (None, *entry['datasets'])
+        ]:
+            _drop_entry(cache, entry_key)
+
+def result_cache_stats():
+    """Hits, misses, evictions, expirations, entries and bytes of the result cache, per function"""
+    cache = _result_cache()
+    with cache['lock']:
+        rows = {name: dict(stats, entries=0, bytes=0) for name, stats in cache['stats'].items()}
+        for (name, _), entry in cache['entries'].items():
+            rows[name]['entries'] += 1
+            rows[name]['bytes'] += entry['bytes']
+    columns = RESULT_CACHE_COUNTERS + ['entries', 'bytes']
+    return pd.DataFrame.from_dict(rows, orient='index', columns=columns).rename_axis('function').sort_index()
+
+def profiled_cache(func=None, show_spinner=True, ttl=RESULT_CACHE_TTL_SECONDS, max_entries=None):
+    """Cache a function in the shared result cache and profile every call, including whether it was a hit.
+
+    Results are keyed by the function's code and arguments (bytes by their content
+    hash) and handed out as copies. Entries live for ttl seconds; max_entries caps
+    how many results of this function are kept. show_spinner (True or a message)
+    shows a spinner while a miss is computed in a script run.
+    """
+    if func is None:
+        return functools.partial(profiled_cache, show_spinner=show_spinner, ttl=ttl, max_entries=max_entries)
+    
+    name = func.__qualname__
+    # Editing the function (a Streamlit hot reload) starts it a fresh set of entries
+    code_hash = code_fingerprint(func.__code__)
+    spinner_text = show_spinner if isinstance(show_spinner, str) else f"Running {func.__name__}(...)."
+    
+    def lookup(args, kwargs, spinner):
+        cache = _result_cache()
+        key = (code_hash, _cache_key(args), _cache_key(kwargs))
+        found, value = _cache_get(cache, name, key)
+        if not found:
+            show = spinner and get_script_run_ctx() is not None
+            with st.spinner(spinner_text) if show else contextlib.nullcontext():
+                value = func(*args, **kwargs)
+            datasets = [arg for arg in args if isinstance(arg, str)]
+            _cache_put(cache, name, key, value, ttl, max_entries, datasets)
+        return found, value
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_stage(func.__name__, kind='call') as record:
+            found, result = lookup(args, kwargs, show_spinner)
+            record['cache'] = 'hit' if found else 'miss'
+        return _copy_result(result)
+    
+    def warm(*args, **kwargs):
+        # Fill the cache from a background thread: no spinner, no profile record
+        lookup(args, kwargs, False)
+    
+    wrapper.clear = functools.partial(clear_cached_results, name)
+    wrapper.warm = warm
+    return wrapper
+
+def select_columns(header):
+    """Columns of a header row the dashboard reads, in load order; raises if a required one is missing"""
+    missing = [col for col in REQUIRED_COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+    return REQUIRED_COLUMNS + [col for col in OPTIONAL_COLUMNS if col in header]
+
+def iter_xlsx_chunks(source, chunk_size=None):
+    """Yield (columns, records) from the first sheet of an XLSX, projected to the columns we use.
+
+    source is a path or file-like object. Rows are streamed through openpyxl read-only
+    mode and emitted chunk_size at a time (all at once when chunk_size is None).
+    Rows blank in every projected column are skipped, even when other columns have
+    values (read_excel only drops rows blank in every column).
+    """
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+        selected = select_columns(header)
+        positions = [header.index(col) for col in selected]
+        width = max(positions) + 1
+        pick = operator.itemgetter(*positions)
+        
+        records = []
+        for row in rows:
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            values = pick(row)
+            # Skip rows with none of the projected columns: they hold nothing a summary groups by
+            if any(value is not None for value in values):
+                records.append(values)
+                if chunk_size and len(records) >= chunk_size:
+                    yield selected, records
+                    records = []
+        if records or not chunk_size:
+            yield selected, records
+    finally:
+        workbook.close()
+
+def records_to_frame(columns, records):
+    """Build a complaints frame from row tuples, with the required columns as categoricals"""
+    values_by_column = list(zip(*records)) if records else [()] * len(columns)
+    df = pd.DataFrame({
+        col: pd.Series(values, dtype=object).infer_objects()
+        for col, values in zip(columns, values_by_column)
+    })
+    df[REQUIRED_COLUMNS] = df[REQUIRED_COLUMNS].astype('category')
+    return parse_date_columns(df)
+
+def parse_date_columns(df):
+    """Convert the DATE_COLUMNS a frame has to datetimes in place; values that are not dates become missing"""
+    for col in DATE_COLUMNS.values():
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+# The registry and snapshots keep the enriched result, so only the latest parse is cached
+@profiled_cache(show_spinner="Parsing workbook...", max_entries=1)
+def load_excel(file_bytes):
+    """Stream the required columns out of the first sheet of an XLSX export.
+
+    Uses openpyxl read-only mode so only the projected cells are kept, and returns
+    (df, parse_seconds) with every required column as a categorical. Optional
+    columns are kept when the export has them: the complaint ID as plain values,
+    the dates as datetimes.
+    """
+    start = time.perf_counter()
+    columns, records = next(iter_xlsx_chunks(io.BytesIO(file_bytes)))
+    df = records_to_frame(columns, records)
+    
+    parse_seconds = time.perf_counter() - start
+    logger.info("Parsed %d rows from XLSX in %.2fs", len(df), parse_seconds)
+    return df, parse_seconds
+
+def export_format(source):
+    """'xlsx', 'csv.gz' or 'csv' for an export (path or file-like), told apart by its first bytes"""
+    if hasattr(source, 'read'):
+        magic = source.read(4)
+        source.seek(0)
+    else:
+        with open(source, 'rb') as f:
+            magic = f.read(4)
+    if magic.startswith(b'PK\x03\x04'):
+        return 'xlsx'
+    return 'csv.gz' if magic.startswith(b'\x1f\x8b') else 'csv'
+
+def iter_csv_frames(source, chunk_size=None):
+    """Yield complaints frames from a CSV or gzipped CSV (path or file-like), projected to the columns we use.
+
+    Only the selected columns are parsed (pandas' C parser), the required ones straight
+    into categoricals, so the frames match what records_to_frame builds from an XLSX:
+    empty cells are missing, other text is kept as is, and rows blank in every selected
+    column are skipped.
+    Frames come chunk_size rows at a time (all at once when chunk_size is None).
+    """
+    compression = 'gzip' if export_format(source) == 'csv.gz' else None
+    read = functools.partial(
+        pd.read_csv, source, compression=compression, encoding='utf-8-sig', engine='c',
+        keep_default_na=False, na_values=['']
+    )
+    names = {str(name).strip(): name for name in read(nrows=0).columns}
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    selected = select_columns(list(names))
+    
+    frames = read(
+        usecols=[names[col] for col in selected],
+        dtype={names[col]: 'category' for col in REQUIRED_COLUMNS},
+        chunksize=chunk_size,
+    )
+    for frame in [frames] if chunk_size is None else frames:
+        frame = frame.rename(columns={name: col for col, name in names.items()})[selected]
+        # Like iter_xlsx_chunks: rows blank in every selected column, whatever the others hold
+        yield parse_date_columns(frame.dropna(how='all').reset_index(drop=True))
+
+@profiled_cache(show_spinner="Parsing CSV...", max_entries=1)
+def load_csv(file_bytes):
+    """Read the required columns of a CSV or gzipped CSV export; returns (df, parse_seconds) like load_excel"""
+    start = time.perf_counter()
+    df = next(iter_csv_frames(io.BytesIO(file_bytes)))
+    
+    parse_seconds = time.perf_counter() - start
+    logger.info("Parsed %d rows from CSV in %.2fs", len(df), parse_seconds)
+    return df, parse_seconds
+
+def iter_export_frames(source, chunk_size=None):
+    """Yield complaints frames from an XLSX, CSV or gzipped CSV export (path or file-like)"""
+    if export_format(source) != 'xlsx':
+        yield from iter_csv_frames(source, chunk_size)
+        return
+    for columns, records in iter_xlsx_chunks(source, chunk_size):
+        yield records_to_frame(columns, records)
+
+def normalize_value(value):
+    """Case- and whitespace-insensitive form of a value, which is what rules match on"""
+    return ' '.join(str(value).split()).casefold()
+
+def compile_rules(spec):
+    """Compile one rule set of the config into lookup tables.
+
+    Values listed under a label match exactly after normalization, aliases match as
+    the value they point to, and prefixes match the start of the normalized value
+    (longest prefix first). Anything else falls back to the default label.
+    """
+    exact = {}
+    for label, values in spec.get('labels', {}).items():
+        for value in values:
+            key = normalize_value(value)
+            if exact.get(key, label) != label:
+                raise ValueError(f"Rule value {value!r} is listed under both {exact[key]!r} and {label!r}")
+            exact[key] = label
+    for alias, value in spec.get('aliases', {}).items():
+        if normalize_value(value) not in exact:
+            raise ValueError(f"Alias {alias!r} points to unknown value {value!r}")
+        exact[normalize_value(alias)] = exact[normalize_value(value)]
+    
+    prefixes = sorted(
+        ((normalize_value(prefix), label) for prefix, label in spec.get('prefixes', {}).items()),
+        key=lambda item: -len(item[0])
+    )
+    labels = set(spec.get('labels', {})) | {label for _, label in prefixes} | {spec['default']}
+    return {
+        'default': spec['default'],
+        'labels': sorted(labels),
+        'exact': exact,
+        'prefixes': prefixes,
+        'report_unmatched': spec.get('report_unmatched', False),
+    }
+
+def load_rules(path=RULES_PATH):
+    """Compiled rule sets of a JSON rules config, and a fingerprint of its contents"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    spec = json.loads(raw)
+    missing = [name for name in RULE_COLUMNS if name not in spec]
+    if missing:
+        raise ValueError(f"Rules file {path} is missing rule set(s): {', '.join(missing)}")
+    return {name: compile_rules(spec[name]) for name in RULE_COLUMNS}, hashlib.sha256(raw).hexdigest()[:12]
+
+# No spinner: this runs at import, before main() sets the page config
+@st.cache_resource(show_spinner=False)
+def _shared_rules(path):
+    """Rules of the first rerun, so cubes, cache keys and reports of one process all share them"""
+    return load_rules(path)
+
+CLASSIFICATION_RULES, RULES_FINGERPRINT = (
+    _shared_rules(RULES_PATH) if get_script_run_ctx(suppress_warning=True) is not None else load_rules()
+)
+
+def match_rule(rules, value):
+    """Label of the rule matching value, or None when no rule does"""
+    if pd.isna(value):
+        return None
+    key = normalize_value(value)
+    label = rules['exact'].get(key)
+    if label is None:
+        label = next((label for prefix, label in rules['prefixes'] if key.startswith(prefix)), None)
+    return label
+
+def classify(rules, value):
+    """Label of the rule matching value, or the rule set's default"""
+    label = match_rule(rules, value)
+    return rules['default'] if label is None else label
+
+def unmatched_values(rules, values):
+    """Distinct non-missing values no rule matches (they get the default label)"""
+    return sorted({value for value in values if not pd.isna(value) and match_rule(rules, value) is None}, key=str)
+
+# Output categories of the enrichment stage (fixed so frames from different uploads concatenate cleanly)
+MAIN_CATEGORIES = CLASSIFICATION_RULES['main_category']['labels']
+STATUS_CATEGORIES = ['Open', 'Resolved']
+DEPARTMENT_CATEGORIES = CLASSIFICATION_RULES['department']['labels']
+
+def map_distinct(series, func, categories):
+    """Apply func once per distinct value of series and broadcast the labels back as a categorical.
+
+    Cost is one Python call per distinct value plus a vectorized take over the codes,
+    so it scales with the cardinality of the column rather than its length.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    labels = pd.Index([func(value) for value in uniques])
+    label_codes = pd.CategoricalIndex(labels, categories=categories).codes
+    return pd.Series(
+        pd.Categorical.from_codes(label_codes[codes], categories=categories),
+        index=series.index
+    )
+
+def classify_status(status_name):
+    """Open/Resolved label for one Status Name value"""
+    return 'Resolved' if 'Resolved' in str(status_name) else 'Open'
+
+def classify_main_category(subcategory):
+    """MainCategory label for one Subcategory value"""
+    return classify(CLASSIFICATION_RULES['main_category'], subcategory)
+
+def classify_department(assigned_user):
+    """Department label for one Assigned User Name value"""
+    return classify(CLASSIFICATION_RULES['department'], assigned_user)
 
-@st.cache_data
 def add_main_category(df):
     """Map Subcategory to MainCategory, default to Others"""
-    df['MainCategory'] = df['Subcategory'].map(MAIN_CATEGORY_MAPPING).fillna('Others')
+    df['MainCategory'] = map_distinct(df['Subcategory'], classify_main_category, MAIN_CATEGORIES)
     return df
 
-@st.cache_data
 def add_status_binary(df):
     """Convert Status Name to Open/Resolved"""
-    df['StatusBinary'] = df['Status Name'].apply(lambda x: 'Resolved' if 'Resolved' in str(x) else 'Open')
+    df['StatusBinary'] = map_distinct(df['Status Name'], classify_status, STATUS_CATEGORIES)
     return df
 
-@st.cache_data
 def add_department(df):
     """Map Assigned User Name to Department"""
-    def get_department(assigned_user):
-        if pd.isna(assigned_user):
-            return 'LMC'
-        assigned_user_str = str(assigned_user).strip()
-        if assigned_user_str.startswith('PWD'):
-            return 'PWD'
-        elif assigned_user_str.startswith('LDA'):
-            return 'LDA'
+    df['Department'] = map_distinct(df['Assigned User Name'], classify_department, DEPARTMENT_CATEGORIES)
+    return df
+
+def enrich_complaints(df):
+    """Add MainCategory, StatusBinary and Department in place and return df"""
+    add_main_category(df)
+    add_status_binary(df)
+    add_department(df)
+    return df
+
+def file_fingerprint(file_bytes):
+    """Content hash of an uploaded file, used as the dataset key"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def path_fingerprint(path, block_size=1 << 20):
+    """file_fingerprint of a file on disk, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _snapshot_path(fingerprint):
+    return os.path.join(SNAPSHOT_DIR, f"{fingerprint}.v{SNAPSHOT_VERSION}.{RULES_FINGERPRINT}.parquet")
+
+def load_snapshot(fingerprint, columns=None):
+    """Return the enriched frame stored for this fingerprint (only columns, if given), or None"""
+    path = _snapshot_path(fingerprint)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path, columns=columns)
+    except Exception:
+        logger.warning("Discarding unreadable snapshot %s", path, exc_info=True)
+        os.remove(path)
+        return None
+    # Touch so the LRU eviction sees this snapshot as recently used
+    os.utime(path)
+    return df
+
+def save_snapshot(fingerprint, df):
+    """Persist an enriched frame and evict old snapshots beyond the size cap"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _snapshot_path(fingerprint)
+    # Sessions are threads of one process and may save the same upload at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    evict_snapshots(keep=fingerprint)
+
+def evict_snapshots(max_bytes=SNAPSHOT_MAX_BYTES, keep=None):
+    """Delete least recently used snapshots and reports until the directory fits in max_bytes"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return
+    entries = []
+    for entry in os.scandir(SNAPSHOT_DIR):
+        if entry.is_file() and entry.name.endswith(('.parquet', '.report.xlsx', '.report.zip')):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    total = sum(size for _, size, _ in entries)
+    keep_path = _snapshot_path(keep) if keep else None
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep_path:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            logger.info("Evicted snapshot %s (%d bytes)", path, size)
+        except FileNotFoundError:
+            pass
+
+def build_cube(df):
+    """Count complaints per combination of CUBE_DIMENSIONS (missing values kept as their own group)"""
+    return (
+        df.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)
+        .size()
+        .rename('Count')
+        .reset_index()
+    )
+
+def concat_complaints(frames):
+    """Concatenate frames, unioning categories so categorical columns stay categorical"""
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    
+    combined = pd.concat(frames, ignore_index=True)
+    for col in frames[0].columns:
+        if all(isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+            combined[col] = pd.api.types.union_categoricals(
+                [frame[col] for frame in frames], sort_categories=True
+            )
+    return combined
+
+def exports_fingerprint(fingerprints, streaming=False):
+    """dataset_id of several exports combined into one, in upload order.
+
+    Streamed exports are summed without removing duplicate complaints, so they get
+    an id of their own rather than that of the deduplicated consolidation.
+    """
+    mode = 'streamed' if streaming else 'consolidated'
+    return file_fingerprint('\n'.join([mode] + list(fingerprints)).encode())
+
+def _parse_export_in_worker(file_bytes):
+    return next(iter_export_frames(io.BytesIO(file_bytes)))
+
+def parse_exports(exports, workers=UPLOAD_WORKERS):
+    """Parse several exports (bytes) in a process pool and consolidate them into one frame.
+
+    Every file is parsed in its own process, so the wall time is about that of the
+    largest file. Complaints that appear in more than one file are kept once, from
+    the last file listing them; rows without a complaint ID are all kept. If any
+    file lacks the ID column the IDs are dropped, as they cannot be compared.
+    Returns (df, stats).
+    """
+    if workers > 1 and len(exports) > 1:
+        # Never forked: a dashboard's server and warm-up threads may hold locks a forked child would inherit
+        context = multiprocessing.get_context(
+            'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        )
+        with ProcessPoolExecutor(min(workers, len(exports)), mp_context=context) as pool:
+            frames = list(pool.map(_parse_export_in_worker, exports))
+    else:
+        frames = [_parse_export_in_worker(file_bytes) for file_bytes in exports]
+    
+    if not all(COMPLAINT_ID_COLUMN in frame.columns for frame in frames):
+        frames = [frame.drop(columns=COMPLAINT_ID_COLUMN, errors='ignore') for frame in frames]
+    df = concat_complaints(frames)
+    duplicates = 0
+    if COMPLAINT_ID_COLUMN in df.columns:
+        ids = df[COMPLAINT_ID_COLUMN]
+        repeated = ids.duplicated(keep='last') & ids.notna()
+        duplicates = int(repeated.sum())
+        if duplicates:
+            df = df[~repeated].reset_index(drop=True)
+    return df, {'files': len(exports), 'duplicates': duplicates}
+
+def changed_values(old, new):
+    """Elementwise "differs" of two aligned columns (missing equals missing), without Python objects.
+
+    Categoricals are compared on codes, after recoding new onto old's categories,
+    datetimes on their int64 values, anything else on row hashes.
+    """
+    if isinstance(old.dtype, pd.CategoricalDtype):
+        new_values = new if isinstance(new.dtype, pd.CategoricalDtype) else new.astype('category')
+        new_codes = new_values.cat.set_categories(old.cat.categories).cat.codes.to_numpy()
+        # A value old never had recodes to -1, like a missing one
+        unknown = (new_codes == -1) & new.notna().to_numpy()
+        return (old.cat.codes.to_numpy() != new_codes) | unknown
+    if pd.api.types.is_datetime64_dtype(old.dtype) and pd.api.types.is_datetime64_dtype(new.dtype):
+        return old.to_numpy('datetime64[ns]').view('int64') != new.to_numpy('datetime64[ns]').view('int64')
+    old_hashes = pd.util.hash_pandas_object(old, index=False).to_numpy()
+    return old_hashes != pd.util.hash_pandas_object(new, index=False).to_numpy()
+
+def merge_incremental(prev_df, prev_cube, new_df):
+    """Apply a new cumulative export on top of the previous enriched snapshot.
+
+    Rows are matched on COMPLAINT_ID_COLUMN; a row has changed when a required column
+    or a date differs (see changed_values). Only new or changed rows are enriched, and
+    the previous cube is patched with the count deltas of the changed, new and removed
+    rows instead of being rebuilt. Returns (df_processed, cube, stats).
+    """
+    positions = pd.Index(prev_df[COMPLAINT_ID_COLUMN]).get_indexer(new_df[COMPLAINT_ID_COLUMN])
+    matched = positions >= 0
+    
+    changed = np.zeros(len(new_df), dtype=bool)
+    dates = [col for col in DATE_COLUMNS.values() if col in prev_df.columns and col in new_df.columns]
+    for col in REQUIRED_COLUMNS + dates:
+        changed[matched] |= changed_values(prev_df[col].iloc[positions[matched]], new_df[col][matched])
+    
+    fresh = ~matched | changed
+    stale = np.ones(len(prev_df), dtype=bool)
+    stale[positions[matched & ~changed]] = False
+    
+    fresh_rows = enrich_complaints(new_df[fresh].reset_index(drop=True))
+    kept_rows = prev_df.iloc[positions[matched & ~changed]]
+    df_processed = concat_complaints([kept_rows, fresh_rows])
+    
+    withdrawn = build_cube(prev_df[stale])
+    withdrawn['Count'] = -withdrawn['Count']
+    cube = combine_cubes([prev_cube, withdrawn, build_cube(fresh_rows)])
+    cube = cube[cube['Count'] != 0].reset_index(drop=True)
+    
+    stats = {
+        'changed': int(changed.sum()),
+        'added': int((~matched).sum()),
+        'removed': int(stale.sum() - changed.sum()),
+    }
+    return df_processed, cube, stats
+
+def stream_cube(source, chunk_size=STREAM_CHUNK_ROWS):
+    """Build the count cube straight from an export without materialising the row-level frame.
+
+    Rows are read chunk_size at a time, classified and grouped per chunk, and folded
+    into running counters, so peak memory is one chunk plus the number of distinct
+    groups. Returns (cube, rows).
+    """
+    counts = collections.Counter()
+    rows = 0
+    for frame in iter_export_frames(source, chunk_size):
+        chunk_cube = build_cube(enrich_complaints(frame))
+        rows += len(frame)
+        # NaN never equals itself, so missing values are folded under None
+        keys = chunk_cube[CUBE_DIMENSIONS].astype(object)
+        keys = keys.where(keys.notna(), None)
+        counts.update(dict(zip(map(tuple, keys.to_numpy()), chunk_cube['Count'].tolist())))
+    
+    cube = pd.DataFrame(list(counts.keys()), columns=CUBE_DIMENSIONS).astype('category')
+    cube['Count'] = pd.Series(list(counts.values()), dtype='int64')
+    return cube, rows
+
+def _latest_path():
+    return os.path.join(SNAPSHOT_DIR, 'latest.json')
+
+def latest_snapshot():
+    """Fingerprint of the most recent snapshot that carries complaint IDs, or None"""
+    try:
+        with open(_latest_path()) as f:
+            fingerprint = json.load(f)['fingerprint']
+    except (OSError, ValueError, KeyError):
+        return None
+    return fingerprint if os.path.exists(_snapshot_path(fingerprint)) else None
+
+def set_latest_snapshot(fingerprint):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(_latest_path(), 'w') as f:
+        json.dump({'fingerprint': fingerprint}, f)
+
+def load_dataset(fingerprint, file_bytes, incremental=False, streaming=False, workers=UPLOAD_WORKERS):
+    """Return (cube, load_info) for an upload, reading its snapshot when one exists.
+
+    file_bytes is one export, or a list of exports consolidated by parse_exports
+    over workers processes.
+    With incremental=True an export with complaint IDs is diffed against the latest
+    stored snapshot, and only its new and changed rows are processed. With
+    streaming=True each export's cube is folded chunk by chunk and no row-level
+    frame (or snapshot) is ever built; several exports' cubes are then summed,
+    without removing complaints listed in more than one of them.
+    """
+    start = time.perf_counter()
+    stats = {}
+    consolidate = isinstance(file_bytes, list)
+    df_processed = load_snapshot(fingerprint)
+    if df_processed is None and streaming:
+        folded = [stream_cube(io.BytesIO(export)) for export in (file_bytes if consolidate else [file_bytes])]
+        cube = combine_cubes([file_cube for file_cube, _ in folded])
+        rows = sum(file_rows for _, file_rows in folded)
+        load_seconds = time.perf_counter() - start
+        logger.info("Streamed %d rows in %.2fs (%d cube cells)", rows, load_seconds, len(cube))
+        if consolidate:
+            stats = {'files': len(file_bytes)}
+        return cube, dict(stats, source='stream', seconds=load_seconds, rows=rows)
+    if df_processed is not None:
+        source = 'snapshot'
+        cube = build_cube(df_processed)
+    else:
+        if consolidate:
+            file_format = 'consolidated'
+            df, stats = parse_exports(file_bytes, workers)
+        else:
+            file_format = export_format(io.BytesIO(file_bytes))
+            df, _ = load_excel(file_bytes) if file_format == 'xlsx' else load_csv(file_bytes)
+        has_ids = COMPLAINT_ID_COLUMN in df.columns and df[COMPLAINT_ID_COLUMN].is_unique
+        
+        base = latest_snapshot() if incremental and has_ids else None
+        prev_df = load_snapshot(base) if base and base != fingerprint else None
+        if prev_df is not None and COMPLAINT_ID_COLUMN in prev_df.columns:
+            prev_entry = _dataset_registry().get(base)
+            prev_cube = prev_entry['cube'] if prev_entry else build_cube(prev_df)
+            df_processed, cube, merge_stats = merge_incremental(prev_df, prev_cube, df)
+            stats = dict(stats, **merge_stats)
+            source = 'incremental'
         else:
-            return 'LMC'
+            df_processed = enrich_complaints(df)
+            cube = build_cube(df_processed)
+            source = file_format
+        
+        try:
+            save_snapshot(fingerprint, df_processed)
+            if has_ids:
+                set_latest_snapshot(fingerprint)
+        except Exception:
+            # A failed snapshot write only costs the next session a re-parse
+            logger.warning("Could not write snapshot for %s", fingerprint, exc_info=True)
     
-    df['Department'] = df['Assigned User Name'].apply(get_department)
-    return df
+    load_seconds = time.perf_counter() - start
+    logger.info("Loaded %d rows from %s in %.2fs (%d cube cells)", len(df_processed), source, load_seconds, len(cube))
+    dates = [basis for basis, col in DATE_COLUMNS.items() if col in df_processed.columns]
+    latest = df_processed[DATE_COLUMNS['Created']].max() if 'Created' in dates else None
+    return cube, dict(
+        stats, source=source, seconds=load_seconds, rows=len(df_processed), dates=dates,
+        latest_created=latest.date() if pd.notna(latest) else None
+    )
+
+# Stand-in registry for code running outside a Streamlit script run (CLI, notebooks)
+_HEADLESS_REGISTRY = {}
+_HEADLESS_REGISTRY_LOCK = threading.Lock()
+
+# Storage a background thread (which has no script run context) was handed by use_storage
+_BACKGROUND_STORAGE = threading.local()
+
+@st.cache_resource
+def _shared_dataset_registry():
+    return {}
+
+# `streamlit run` re-executes this module on every rerun, so a module-level lock would
+# not be shared between sessions; the lock lives in the resource cache with the registry
+@st.cache_resource
+def _shared_registry_lock():
+    return threading.Lock()
+
+def _registry_lock():
+    storage = getattr(_BACKGROUND_STORAGE, 'current', None)
+    if storage is not None:
+        return storage['lock']
+    if get_script_run_ctx() is None:
+        return _HEADLESS_REGISTRY_LOCK
+    return _shared_registry_lock()
+
+_HEADLESS_LOAD_LOCKS = {}
+
+@st.cache_resource
+def _shared_load_locks():
+    return {}
+
+def _load_lock(dataset_id):
+    """Lock held while dataset_id is loaded, so sessions opening the same upload at once parse it once"""
+    locks = _HEADLESS_LOAD_LOCKS if get_script_run_ctx() is None else _shared_load_locks()
+    with _registry_lock():
+        return locks.setdefault(dataset_id, threading.Lock())
+
+def _release_load_lock(dataset_id):
+    locks = _HEADLESS_LOAD_LOCKS if get_script_run_ctx() is None else _shared_load_locks()
+    with _registry_lock():
+        locks.pop(dataset_id, None)
+
+def _dataset_registry():
+    """Process-wide map of dataset_id -> {'cube', 'info', 'sessions'}, shared by all sessions"""
+    storage = getattr(_BACKGROUND_STORAGE, 'current', None)
+    if storage is not None:
+        return storage['registry']
+    if get_script_run_ctx() is None:
+        return _HEADLESS_REGISTRY
+    return _shared_dataset_registry()
+
+def shared_storage():
+    """The dataset registry, its lock and the result cache seen from here, to hand to a background thread"""
+    return {'registry': _dataset_registry(), 'lock': _registry_lock(), 'cache': _result_cache()}
+
+@contextlib.contextmanager
+def use_storage(storage):
+    """Resolve the registry, its lock and the result cache to storage (from shared_storage) in this thread"""
+    _BACKGROUND_STORAGE.current = storage
+    try:
+        yield
+    finally:
+        _BACKGROUND_STORAGE.current = None
+
+def compact_cube(cube):
+    """Copy of a count cube with categorical dimensions and int32 counts, as stored in the registry"""
+    cube = cube.astype({dim: 'category' for dim in CUBE_DIMENSIONS})
+    cube['Count'] = cube['Count'].astype('int32')
+    return cube
+
+def open_dataset(file_bytes, incremental=False, streaming=False, auxiliary=False):
+    """Load an upload (bytes, or a list of bytes to consolidate) into the registry once and return its dataset_id.
+
+    An auxiliary dataset (a comparison baseline) is left out of the JSON API's listing
+    and default, until the same upload is opened as a main dataset.
+    """
+    with profile_stage('load_dataset') as record:
+        if isinstance(file_bytes, list):
+            dataset_id = exports_fingerprint(map(file_fingerprint, file_bytes), streaming)
+        else:
+            dataset_id = file_fingerprint(file_bytes)
+        registry = _dataset_registry()
+        record['cache'] = 'hit' if dataset_id in registry else 'miss'
+        if dataset_id not in registry:
+            with _load_lock(dataset_id):
+                # Another session may have loaded it while this one waited for the lock
+                if dataset_id not in registry:
+                    with st.spinner("Loading dataset..."):
+                        cube, load_info = load_dataset(dataset_id, file_bytes, incremental, streaming)
+                    register_dataset(dataset_id, cube, load_info, auxiliary)
+                else:
+                    record['cache'] = 'hit'
+            _release_load_lock(dataset_id)
+        entry = registry.get(dataset_id)
+        if entry is not None and not auxiliary:
+            entry['auxiliary'] = False
+    return dataset_id
+
+def register_dataset(dataset_id, cube, load_info, auxiliary=False):
+    """Make a count cube available to the summary functions under dataset_id.
+
+    Registered cubes are shared by every session and must be treated as read-only.
+    The registering session (if any) becomes the dataset's first holder. A dataset
+    that is already registered is kept as it is (with its holders and the views built
+    from it), and the registering session is added as a holder. Auxiliary datasets
+    (date windows, comparison baselines) are not listed by the JSON API.
+    """
+    ctx = get_script_run_ctx()
+    sessions = {ctx.session_id: time.monotonic()} if ctx else {}
+    cube = compact_cube(cube)
+    with _registry_lock():
+        entry = _dataset_registry().setdefault(dataset_id, {
+            'cube': cube, 'info': load_info, 'sessions': sessions, 'auxiliary': auxiliary
+        })
+        if entry['sessions'] is not sessions:
+            entry['sessions'].update(sessions)
+
+def acquire_datasets(dataset_ids):
+    """Make the current session a holder of exactly dataset_ids and free datasets nobody holds.
+
+    A session holds the datasets it is showing. A session that stops rerunning (a
+    closed tab) is dropped as a holder after DATASET_TTL_SECONDS, and a dataset is
+    removed from the registry once it has no holders left.
+    """
+    session_id = get_script_run_ctx().session_id
+    now = time.monotonic()
+    registry = _dataset_registry()
+    with _registry_lock():
+        for other_id, entry in list(registry.items()):
+            holders = entry['sessions']
+            if other_id in dataset_ids:
+                holders[session_id] = now
+            else:
+                holders.pop(session_id, None)
+            for holder, seen in list(holders.items()):
+                if now - seen > DATASET_TTL_SECONDS:
+                    del holders[holder]
+            if not holders:
+                del registry[other_id]
+                clear_cached_results(dataset_id=other_id)
+                logger.info("Released dataset %s", other_id)
+
+def hold_datasets(*dataset_ids):
+    """Refresh the current session's hold on the datasets a fragment shows.
+
+    Fragment reruns skip main() and its acquire_datasets call, so every dataset
+    fragment calls this first. If a dataset was released meanwhile (the session was
+    idle too long), the whole page is rerun, which loads it again.
+    """
+    session_id = get_script_run_ctx().session_id
+    now = time.monotonic()
+    registry = _dataset_registry()
+    with _registry_lock():
+        released = [dataset_id for dataset_id in dataset_ids if dataset_id not in registry]
+        for dataset_id in dataset_ids:
+            if dataset_id in registry:
+                registry[dataset_id]['sessions'][session_id] = now
+    if released:
+        logger.info("Reloading released dataset(s) %s", ', '.join(released))
+        st.rerun()
+
+def dataset_id_for_upload(uploaded_files, incremental=False, streaming=False, state_prefix='', auxiliary=False):
+    """Resolve the dataset_id of the uploaded file(s), hashing their bytes only when the upload changes.
+
+    Several files are consolidated into one dataset. state_prefix keeps the session
+    state of a second uploader (the comparison baseline, opened as auxiliary) apart
+    from the main one.
+    """
+    registry = _dataset_registry()
+    file_key, dataset_key = f'{state_prefix}upload_file_id', f'{state_prefix}dataset_id'
+    file_ids = [uploaded_file.file_id for uploaded_file in uploaded_files]
+    if (
+        st.session_state.get(file_key) != file_ids
+        or st.session_state.get(dataset_key) not in registry
+    ):
+        exports = [uploaded_file.getvalue() for uploaded_file in uploaded_files]
+        st.session_state[dataset_key] = open_dataset(
+            exports[0] if len(exports) == 1 else exports, incremental, streaming, auxiliary
+        )
+        st.session_state[file_key] = file_ids
+    return st.session_state[dataset_key]
+
+def get_cube(dataset_id):
+    """Count cube of a registered dataset"""
+    return _dataset_registry()[dataset_id]['cube']
+
+def get_load_info(dataset_id):
+    """Load source, time and row count of a registered dataset"""
+    return _dataset_registry()[dataset_id]['info']
+
+def dataset_unmatched(dataset_id):
+    """{rule set name: values no rule matched} of a registered dataset, for rule sets that report them"""
+    cube = get_cube(dataset_id)
+    report = {}
+    for name, rules in CLASSIFICATION_RULES.items():
+        if rules['report_unmatched']:
+            values = unmatched_values(rules, cube[RULE_COLUMNS[name]].unique())
+            if values:
+                report[name] = values
+    return report
+
+# ========== DATE WINDOWS ==========
+def day_number(day):
+    """Days since 1970-01-01 of a date"""
+    return int(np.datetime64(day, 'D').astype('int64'))
+
+def build_daily_cube(df, date_column):
+    """Prefix sums of complaint counts per cube cell and day of date_column, for window_cube.
 
-@st.cache_data
-def generate_status_summary(df):
+    A dict of 'cells', the cube cells (CUBE_DIMENSIONS) with dated complaints, stored
+    once rather than once per day; 'keys', cell * 'stride' + days since 'first' of
+    every (cell, day) with complaints, sorted; and 'cumulative', the running total of
+    their counts from 0. 'first' / 'last' are day_number values. Complaints without
+    a date are left out.
+    """
+    dated = df[df[date_column].notna()]
+    days = dated[date_column].to_numpy(dtype='datetime64[D]').astype('int64')
+    grouped = dated.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)
+    cells = grouped.size().reset_index()[CUBE_DIMENSIONS].astype({dim: 'category' for dim in CUBE_DIMENSIONS})
+    first, last = (int(days.min()), int(days.max())) if len(days) else (0, -1)
+    stride = max(last - first + 1, 1)
+    keys, counts = np.unique(grouped.ngroup().to_numpy('int64') * stride + (days - first), return_counts=True)
+    return {
+        'cells': cells, 'keys': keys, 'cumulative': np.concatenate([[0], np.cumsum(counts)]),
+        'stride': stride, 'first': first, 'last': last,
+    }
+
+def window_cube(daily, start, end):
+    """Count cube of the complaints dated start..end (inclusive) from a daily cube.
+
+    Each cell's days are contiguous in the sorted keys, so its count in the window is
+    the difference of two prefix sums, found by two binary searches; nothing is grouped.
+    """
+    lo_day = max(day_number(start), daily['first']) - daily['first']
+    hi_day = min(day_number(end), daily['last']) - daily['first']
+    cells = daily['cells']
+    if lo_day > hi_day:
+        return cells.iloc[:0].assign(Count=np.zeros(0, 'int32'))
+    
+    base = np.arange(len(cells), dtype='int64') * daily['stride']
+    lo = np.searchsorted(daily['keys'], base + lo_day, side='left')
+    hi = np.searchsorted(daily['keys'], base + hi_day, side='right')
+    counts = daily['cumulative'][hi] - daily['cumulative'][lo]
+    in_window = counts > 0
+    return cells[in_window].assign(Count=counts[in_window].astype('int32')).reset_index(drop=True)
+
+def get_daily_cube(dataset_id, basis):
+    """Daily cube of a registered dataset by DATE_COLUMNS[basis], or None when it cannot be built.
+
+    Built on first use from the dataset's snapshot and kept on its registry entry.
+    Streamed uploads have no snapshot, and exports without the column no such dates.
+    """
+    entry = _dataset_registry()[dataset_id]
+    daily = entry.setdefault('daily', {})
+    if basis not in daily:
+        df = None
+        if basis in entry['info'].get('dates', ()):
+            with profile_stage('build_daily_cube'):
+                df = load_snapshot(dataset_id, columns=CUBE_DIMENSIONS + [DATE_COLUMNS[basis]])
+        daily[basis] = build_daily_cube(df, DATE_COLUMNS[basis]) if df is not None else None
+    return daily[basis]
+
+def dataset_date_range(dataset_id, basis):
+    """(first, last) date of a registered dataset by basis, or None when it has no such dates"""
+    daily = get_daily_cube(dataset_id, basis)
+    if daily is None or not len(daily['keys']):
+        return None
+    return tuple(datetime.date(1970, 1, 1) + datetime.timedelta(days=daily[end]) for end in ('first', 'last'))
+
+def open_window_dataset(dataset_id, basis, start, end):
+    """Register the complaints of a dataset dated start..end by basis as a dataset; returns its id.
+
+    The window is an ordinary registered dataset, so every summary, leaderboard and
+    download works on it unchanged and is cached under its own id.
+    """
+    window_id = f"{dataset_id}.{basis.lower()}.{start:%Y%m%d}-{end:%Y%m%d}"
+    if window_id not in _dataset_registry():
+        with profile_stage('window_cube'):
+            start_time = time.perf_counter()
+            cube = window_cube(get_daily_cube(dataset_id, basis), start, end)
+            register_dataset(window_id, cube, {
+                'source': 'window', 'seconds': time.perf_counter() - start_time, 'rows': int(cube['Count'].sum()),
+                'parent': dataset_id, 'basis': basis, 'start': start, 'end': end,
+            }, auxiliary=True)
+    return window_id
+
+def combine_cubes(cubes):
+    """Sum several count cubes into one"""
+    if len(cubes) == 1:
+        return cubes[0]
+    return (
+        concat_complaints(cubes)
+        .groupby(CUBE_DIMENSIONS, observed=True, dropna=False)['Count'].sum()
+        .reset_index()
+    )
+
+# Status columns every drill-down reports, in display order
+STATUS_COLUMNS = ['Open', 'Resolved']
+OFFICER_COLUMNS = ['Rank', 'Officer Name', 'Open', 'Resolved', 'Total', '% Closure']
+SUBTOTAL_LABEL = '**Subtotal**'
+
+def filter_cube(cube, filters=None):
+    """Rows of the cube matching every {dimension: value or list of values} filter"""
+    if not filters:
+        return cube
+    mask = pd.Series(True, index=cube.index)
+    for dim, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            mask &= cube[dim].isin(list(value))
+        else:
+            mask &= cube[dim] == value
+    return cube[mask]
+
+def add_closure_columns(counts, total_column='Total'):
+    """Add the total and % Closure columns to a frame of Open/Resolved counts"""
+    counts[total_column] = counts['Open'] + counts['Resolved']
+    closure = counts['Resolved'] / counts[total_column].where(counts[total_column] > 0) * 100
+    counts['% Closure'] = closure.fillna(0).round(1)
+    return counts
+
+def _with_subtotals(counts, dims):
+    """Insert a subtotal row after every group at each level above the last"""
+    levels = [counts.index.get_level_values(i).unique() for i in range(len(dims))]
+    frames = [counts]
+    sort_keys = [
+        [level.get_indexer(counts.index.get_level_values(i)) for i, level in enumerate(levels)]
+    ]
+    
+    for depth in range(1, len(dims)):
+        sub = counts.groupby(level=list(range(depth)), observed=True).sum()
+        values = [sub.index.get_level_values(i) for i in range(depth)]
+        padding = [[SUBTOTAL_LABEL] * len(sub)] * (len(dims) - depth)
+        sub.index = pd.MultiIndex.from_arrays(
+            [value.astype(object) for value in values] + padding, names=dims
+        )
+        frames.append(sub)
+        # Subtotal rows sort after every row of their group
+        sort_keys.append(
+            [levels[i].get_indexer(values[i]) for i in range(depth)]
+            + [np.full(len(sub), len(levels[i])) for i in range(depth, len(dims))]
+        )
+    
+    counts.index = pd.MultiIndex.from_arrays(
+        [counts.index.get_level_values(i).astype(object) for i in range(len(dims))], names=dims
+    )
+    combined = pd.concat(frames)
+    keys = [np.concatenate([part[i] for part in sort_keys]) for i in range(len(dims))]
+    return combined.iloc[np.lexsort(keys[::-1])]
+
+def drilldown(cube, dims, filters=None, subtotals=False, total_label=None, total_column='Total'):
+    """Open / Resolved / Total / % Closure grouped by any list of cube dimensions.
+
+    filters narrows the cube first ({dimension: value or list of values}), subtotals
+    adds a row after each group at every level above the last, and total_label
+    appends a grand total row. Returns an empty frame when nothing matches.
+    """
+    filtered = filter_cube(cube, filters)
+    if filtered.empty:
+        return pd.DataFrame(columns=STATUS_COLUMNS + [total_column, '% Closure'])
+    
+    counts = (
+        filtered.groupby(list(dims) + ['StatusBinary'], observed=True)['Count'].sum()
+        .unstack(fill_value=0)
+        .reindex(columns=STATUS_COLUMNS, fill_value=0)
+    )
+    counts.columns = pd.Index(STATUS_COLUMNS, name='StatusBinary')
+    return _finish_drilldown(counts, dims, subtotals, total_label, total_column)
+
+def _finish_drilldown(counts, dims, subtotals=False, total_label=None, total_column='Total'):
+    """Add subtotal rows, the total row and closure columns to grouped Open/Resolved counts"""
+    grand_total = counts.sum()
+    
+    if subtotals and len(dims) > 1:
+        counts = _with_subtotals(counts, dims)
+    
+    if total_label is not None:
+        label = total_label if len(dims) == 1 else (total_label,) + ('',) * (len(dims) - 1)
+        total_row = pd.DataFrame([grand_total.values], columns=counts.columns, index=[label])
+        counts = pd.concat([counts, total_row])
+    
+    return add_closure_columns(counts, total_column)
+
+# Columns of a snapshot comparison, in display order
+DIFF_COLUMNS = ['Δ Total', 'Newly Resolved', 'Reopened', 'Δ Open', 'Open Now']
+
+def diff_cubes(before, after, dims, filters=None):
+    """Change in complaint counts per group between an earlier and a later count cube.
+
+    The earlier cube's counts are subtracted from the later one's, so the cost is a
+    group-by over the cube cells and no complaint rows are joined. Δ Total is the net change
+    in complaints (new ones less those no longer listed, so it can be negative),
+    Newly Resolved / Reopened the net rise / fall of resolved tickets (a group where
+    some tickets closed and others reopened shows only the balance).
+    Groups without any change are left out.
+    """
+    withdrawn = before.copy()
+    withdrawn['Count'] = -withdrawn['Count'].astype('int64')
+    delta = drilldown(combine_cubes([after, withdrawn]), dims, filters)
+    if delta.empty:
+        return pd.DataFrame(columns=DIFF_COLUMNS)
+    
+    resolved = delta['Resolved']
+    changes = pd.DataFrame({
+        'Δ Total': delta['Total'],
+        'Newly Resolved': resolved.clip(lower=0),
+        'Reopened': (-resolved).clip(lower=0),
+        'Δ Open': delta['Open'],
+    })
+    changes = changes[(changes['Δ Total'] != 0) | (changes['Δ Open'] != 0) | (resolved != 0)]
+    changes.columns.name = None
+    changes['Open Now'] = drilldown(after, dims, filters)['Open'].reindex(changes.index, fill_value=0)
+    return changes[DIFF_COLUMNS]
+
+def build_leaderboards(cube):
+    """Ranked LMC officer tables for every zone, every main category and every zone + category pair.
+
+    All three views are rolled up from one grouped pass over the LMC cells, sorted
+    and ranked together (by open tickets, ties in officer order), then split into
+    {(zone, main_category): table} with None standing for "all" in either position.
+    """
+    lmc = cube[(cube['Department'] == 'LMC') & cube['Assigned User Name'].notna()]
+    if lmc.empty:
+        return {}
+    
+    officer = 'Assigned User Name'
+    counts = (
+        lmc.groupby(['Zone Name', 'MainCategory', officer, 'StatusBinary'], observed=True, dropna=False)['Count'].sum()
+        .unstack(fill_value=0)
+        .reindex(columns=STATUS_COLUMNS, fill_value=0)
+    )
+    # Complaints without a zone count towards their category, but have no zone view
+    with_zone = counts[counts.index.get_level_values('Zone Name').notna()]
+    views = [
+        with_zone,
+        with_zone.groupby(level=['Zone Name', officer], observed=True).sum(),
+        counts.groupby(level=['MainCategory', officer], observed=True).sum(),
+    ]
+    boards = pd.concat([view.reset_index() for view in views], ignore_index=True)
+    for key in ['Zone Name', 'MainCategory']:
+        boards[key] = boards[key].astype(object).where(boards[key].notna(), None)
+    
+    group = boards.groupby(['Zone Name', 'MainCategory'], dropna=False, sort=False).ngroup().to_numpy()
+    officer_order = pd.Categorical(boards[officer], categories=cube[officer].cat.categories).codes
+    boards = boards.iloc[np.lexsort((officer_order, -boards['Open'].to_numpy(), group))]
+    boards['Rank'] = boards.groupby(group[boards.index]).cumcount() + 1
+    boards = add_closure_columns(boards).rename(columns={officer: 'Officer Name'})
+    
+    return {
+        tuple(None if pd.isna(value) else value for value in key): table[OFFICER_COLUMNS].reset_index(drop=True)
+        for key, table in boards.groupby(['Zone Name', 'MainCategory'], dropna=False, sort=False)
+    }
+
+def _entry_leaderboards(entry):
+    if 'leaderboards' not in entry:
+        with profile_stage('build_leaderboards'):
+            entry['leaderboards'] = build_leaderboards(entry['cube'])
+    return entry['leaderboards']
+
+def get_leaderboards(dataset_id):
+    """Officer leaderboards of a registered dataset, built on first use and shared by all sessions"""
+    return _entry_leaderboards(_dataset_registry()[dataset_id])
+
+def officer_leaderboard(dataset_id, zone=None, main_category=None, top_k=None):
+    """Ranked LMC officers of one zone and/or main category (top_k rows if given); a lookup, not a groupby"""
+    board = get_leaderboards(dataset_id).get((zone, main_category))
+    if board is None:
+        return pd.DataFrame()
+    return board.head(top_k).copy() if top_k else board.copy()
+
+@profiled_cache
+def generate_drilldown(dataset_id, dims, filters=None, subtotals=False):
+    """Cached drill-down over any dimensions of a registered dataset, e.g. Zone x Department"""
+    return drilldown(get_cube(dataset_id), list(dims), filters, subtotals)
+
+@profiled_cache
+def generate_status_summary(dataset_id):
     """Generate the status-wise summary table"""
-    summary = df.groupby(['MainCategory', 'StatusBinary']).size().unstack(fill_value=0)
-    
-    # Ensure columns exist
-    if 'Open' not in summary.columns:
-        summary['Open'] = 0
-    if 'Resolved' not in summary.columns:
-        summary['Resolved'] = 0
-    
-    # Calculate Grand Total first
-    summary['Grand Total'] = summary['Open'] + summary['Resolved']
-    
-    # Calculate % Closure (avoid division by zero)
-    summary['% Closure'] = summary.apply(
-        lambda row: (row['Resolved'] / row['Grand Total'] * 100) if row['Grand Total'] > 0 else 0, 
-        axis=1
-    ).round(1)
-    
-    # Add TOTAL row
-    total_open = summary['Open'].sum()
-    total_resolved = summary['Resolved'].sum()
-    total_grand = total_open + total_resolved
-    total_pct = (total_resolved / total_grand * 100) if total_grand > 0 else 0
-    
-    total_row = pd.DataFrame({
-        'Open': [total_open],
-        'Resolved': [total_resolved],
-        'Grand Total': [total_grand],
-        '% Closure': [total_pct]
-    }, index=['**TOTAL**'])
-    
-    summary = pd.concat([summary, total_row])
-    return summary
-
-@st.cache_data
-def generate_subcategory_summary(df, main_category):
+    return drilldown(
+        get_cube(dataset_id), ['MainCategory'],
+        total_label='**TOTAL**', total_column='Grand Total'
+    )
+
+@profiled_cache
+def generate_subcategory_summary(dataset_id, main_category):
     """Generate subcategory drill-down for a specific MainCategory"""
-    # Filter by MainCategory
-    filtered_df = df[df['MainCategory'] == main_category]
-    
-    # Pivot by Subcategory and StatusBinary
-    summary = filtered_df.groupby(['Subcategory', 'StatusBinary']).size().unstack(fill_value=0)
-    
-    # Ensure columns exist
-    if 'Open' not in summary.columns:
-        summary['Open'] = 0
-    if 'Resolved' not in summary.columns:
-        summary['Resolved'] = 0
-    
-    # Calculate Grand Total
-    summary['Grand Total'] = summary['Open'] + summary['Resolved']
-    
-    # Calculate % Closure
-    summary['% Closure'] = summary.apply(
-        lambda row: (row['Resolved'] / row['Grand Total'] * 100) if row['Grand Total'] > 0 else 0, 
-        axis=1
-    ).round(1)
-    
-    # Add TOTAL row for this category
-    total_open = summary['Open'].sum()
-    total_resolved = summary['Resolved'].sum()
-    total_grand = total_open + total_resolved
-    total_pct = (total_resolved / total_grand * 100) if total_grand > 0 else 0
-    
-    total_row = pd.DataFrame({
-        'Open': [total_open],
-        'Resolved': [total_resolved],
-        'Grand Total': [total_grand],
-        '% Closure': [total_pct]
-    }, index=[f'**{main_category} Total**'])
-    
-    summary = pd.concat([summary, total_row])
-    return summary
-
-@st.cache_data
-def generate_zone_subcategory_summary(df, main_category, zone):
+    return drilldown(
+        get_cube(dataset_id), ['Subcategory'], {'MainCategory': main_category},
+        total_label=f'**{main_category} Total**', total_column='Grand Total'
+    )
+
+@profiled_cache
+def generate_zone_subcategory_summary(dataset_id, main_category, zone):
     """Generate subcategory drill-down for a specific MainCategory and Zone"""
-    # Filter by MainCategory and Zone
-    filtered_df = df[(df['MainCategory'] == main_category) & (df['Zone Name'] == zone)]
+    return drilldown(
+        get_cube(dataset_id), ['Subcategory'], {'MainCategory': main_category, 'Zone Name': zone},
+        total_label=f'**{main_category} - {zone} Total**', total_column='Grand Total'
+    )
+
+@profiled_cache
+def generate_department_category_summary(dataset_id, department):
+    """Generate department-wise main category summary"""
+    return drilldown(
+        get_cube(dataset_id), ['MainCategory'], {'Department': department},
+        total_label=f'**{department} Total**', total_column='Grand Total'
+    )
+
+@profiled_cache
+def generate_snapshot_diff(dataset_id, baseline_id, dims):
+    """Change in counts per group from a baseline dataset to dataset_id"""
+    return diff_cubes(get_cube(baseline_id), get_cube(dataset_id), list(dims))
+
+def generate_officer_performance_by_category(dataset_id, main_category):
+    """Generate officer-wise ticket summary for a specific MainCategory (LMC only)"""
+    return officer_leaderboard(dataset_id, main_category=main_category)
+
+def generate_officer_performance_by_zone(dataset_id, zone):
+    """Generate officer-wise ticket summary for a specific Zone (LMC only)"""
+    return officer_leaderboard(dataset_id, zone=zone)
+
+def generate_officer_performance_category_zone(dataset_id, main_category, zone):
+    """Generate officer-wise ticket summary for specific MainCategory AND Zone (LMC only)"""
+    return officer_leaderboard(dataset_id, zone=zone, main_category=main_category)
+
+# ========== HEADLESS REPORTS ==========
+
+# Sheet names of the Batch 1-5 report, in workbook order
+REPORT_SHEETS = [
+    'Batch1 Main Category',
+    'Batch2 Subcategory',
+    'Batch3 Zone Subcategory',
+    'Batch4 Department',
+    'Batch5 Officers by Zone',
+    'Batch5 Officers by Category',
+    'Batch5 Officers Zone+Category',
+]
+
+def report_tasks(dataset_id):
+    """(sheet, key columns, summary function name, args, index label) for every Batch 1-5 table"""
+    cube = get_cube(dataset_id)
+    categories = sorted(cube['MainCategory'].unique())
+    zones = sorted(cube['Zone Name'].dropna().unique())
+    departments = sorted(cube['Department'].unique())
+    lmc_zones = sorted(cube.loc[cube['Department'] == 'LMC', 'Zone Name'].dropna().unique())
     
-    if filtered_df.empty:
-        return pd.DataFrame()
+    tasks = [('Batch1 Main Category', {}, 'generate_status_summary', (), 'MainCategory')]
+    tasks += [
+        ('Batch2 Subcategory', {'MainCategory': cat}, 'generate_subcategory_summary', (cat,), 'Subcategory')
+        for cat in categories
+    ]
+    tasks += [
+        ('Batch3 Zone Subcategory', {'Zone': zone, 'MainCategory': cat},
+         'generate_zone_subcategory_summary', (cat, zone), 'Subcategory')
+        for zone in zones for cat in categories
+    ]
+    tasks += [
+        ('Batch4 Department', {'Department': dept}, 'generate_department_category_summary', (dept,), 'MainCategory')
+        for dept in departments
+    ]
+    tasks += [
+        ('Batch5 Officers by Zone', {'Zone': zone}, 'generate_officer_performance_by_zone', (zone,), None)
+        for zone in lmc_zones
+    ]
+    tasks += [
+        ('Batch5 Officers by Category', {'MainCategory': cat}, 'generate_officer_performance_by_category', (cat,), None)
+        for cat in categories
+    ]
+    tasks += [
+        ('Batch5 Officers Zone+Category', {'Zone': zone, 'MainCategory': cat},
+         'generate_officer_performance_category_zone', (cat, zone), None)
+        for zone in lmc_zones for cat in categories
+    ]
+    return tasks
+
+def run_report_task(dataset_id, task):
+    """Compute one report table, with its key columns in front"""
+    sheet, keys, func_name, args, index_label = task
+    table = globals()[func_name](dataset_id, *args)
+    if table.empty:
+        return sheet, table
+    if index_label is not None:
+        table = table.rename_axis(index_label).reset_index()
+    for position, (key, value) in enumerate(keys.items()):
+        table.insert(position, key, value)
+    return sheet, table
+
+def _init_report_worker(dataset_id, cube, load_info):
+    register_dataset(dataset_id, cube, load_info)
+
+def _run_report_task_in_worker(args):
+    return run_report_task(*args)
+
+def iter_report_tables(dataset_id, workers=1):
+    """Yield (sheet, table) for every Batch 1-5 table in REPORT_SHEETS order, spreading them over a process pool"""
+    tasks = report_tasks(dataset_id)
+    if workers > 1:
+        init_args = (dataset_id, get_cube(dataset_id), get_load_info(dataset_id))
+        with ProcessPoolExecutor(workers, initializer=_init_report_worker, initargs=init_args) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            yield from pool.map(_run_report_task_in_worker, [(dataset_id, task) for task in tasks], chunksize=chunksize)
+    else:
+        for task in tasks:
+            yield run_report_task(dataset_id, task)
+
+def _load_export(path, streaming=False):
+    if streaming:
+        # The workbook is read straight from disk, never held in memory as a whole
+        start = time.perf_counter()
+        fingerprint = path_fingerprint(path)
+        cube, rows = stream_cube(path)
+        return fingerprint, cube, {'source': 'stream', 'seconds': time.perf_counter() - start, 'rows': rows}
     
-    # Pivot by Subcategory and StatusBinary
-    summary = filtered_df.groupby(['Subcategory', 'StatusBinary']).size().unstack(fill_value=0)
-    
-    # Ensure columns exist
-    if 'Open' not in summary.columns:
-        summary['Open'] = 0
-    if 'Resolved' not in summary.columns:
-        summary['Resolved'] = 0
-    
-    # Calculate Grand Total
-    summary['Grand Total'] = summary['Open'] + summary['Resolved']
-    
-    # Calculate % Closure
-    summary['% Closure'] = summary.apply(
-        lambda row: (row['Resolved'] / row['Grand Total'] * 100) if row['Grand Total'] > 0 else 0, 
-        axis=1
-    ).round(1)
-    
-    # Add TOTAL row for this zone+category combo
-    total_open = summary['Open'].sum()
-    total_resolved = summary['Resolved'].sum()
-    total_grand = total_open + total_resolved
-    total_pct = (total_resolved / total_grand * 100) if total_grand > 0 else 0
-    
-    total_row = pd.DataFrame({
-        'Open': [total_open],
-        'Resolved': [total_resolved],
-        'Grand Total': [total_grand],
-        '% Closure': [total_pct]
-    }, index=[f'**{main_category} - {zone} Total**'])
-    
-    summary = pd.concat([summary, total_row])
-    return summary
-
-@st.cache_data
-def generate_department_category_summary(df, department):
-    """Generate department-wise main category summary"""
-    # Filter by Department
-    filtered_df = df[df['Department'] == department]
+    with open(path, 'rb') as f:
+        file_bytes = f.read()
+    fingerprint = file_fingerprint(file_bytes)
+    cube, load_info = load_dataset(fingerprint, file_bytes)
+    return fingerprint, cube, load_info
+
+def load_exports(paths, workers=1, streaming=False):
+    """Load one or more exports as one dataset; returns the registered dataset_id.
+
+    Several exports are consolidated by parse_exports, except when streaming: their
+    cubes are then summed as they are read, without removing duplicate complaints.
+    """
+    if len(paths) > 1 and not streaming:
+        exports = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                exports.append(f.read())
+        dataset_id = exports_fingerprint(map(file_fingerprint, exports))
+        cube, load_info = load_dataset(dataset_id, exports, workers=workers)
+        register_dataset(dataset_id, cube, load_info)
+        return dataset_id
     
-    if filtered_df.empty:
-        return pd.DataFrame()
+    load = functools.partial(_load_export, streaming=streaming)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(min(workers, len(paths))) as pool:
+            loaded = list(pool.map(load, paths))
+    else:
+        loaded = [load(path) for path in paths]
     
-    # Pivot by MainCategory and StatusBinary
-    summary = filtered_df.groupby(['MainCategory', 'StatusBinary']).size().unstack(fill_value=0)
-    
-    # Ensure columns exist
-    if 'Open' not in summary.columns:
-        summary['Open'] = 0
-    if 'Resolved' not in summary.columns:
-        summary['Resolved'] = 0
-    
-    # Calculate Grand Total
-    summary['Grand Total'] = summary['Open'] + summary['Resolved']
-    
-    # Calculate % Closure
-    summary['% Closure'] = summary.apply(
-        lambda row: (row['Resolved'] / row['Grand Total'] * 100) if row['Grand Total'] > 0 else 0, 
-        axis=1
-    ).round(1)
-    
-    # Add TOTAL row for this department
-    total_open = summary['Open'].sum()
-    total_resolved = summary['Resolved'].sum()
-    total_grand = total_open + total_resolved
-    total_pct = (total_resolved / total_grand * 100) if total_grand > 0 else 0
-    
-    total_row = pd.DataFrame({
-        'Open': [total_open],
-        'Resolved': [total_resolved],
-        'Grand Total': [total_grand],
-        '% Closure': [total_pct]
-    }, index=[f'**{department} Total**'])
-    
-    summary = pd.concat([summary, total_row])
-    return summary
-
-@st.cache_data
-def get_all_subcategory_summaries(df, main_categories):
-    """Pre-compute all subcategory summaries for faster downloads"""
-    all_sub_data = []
-    for main_cat in main_categories:
-        sub_summary = generate_subcategory_summary(df, main_cat)
-        sub_summary['MainCategory'] = main_cat
-        all_sub_data.append(sub_summary.reset_index())
-    
-    return pd.concat(all_sub_data, ignore_index=True)
-
-@st.cache_data
-def generate_officer_performance_by_category(df, main_category):
-    """Generate officer-wise ticket summary for a specific MainCategory (LMC only)"""
-    # Filter: LMC department + MainCategory
-    filtered_df = df[
-        (df['Department'] == 'LMC') & 
-        (df['MainCategory'] == main_category)
-    ]
+    fingerprints = [fingerprint for fingerprint, _, _ in loaded]
+    # Several exports get here only when streamed; keyed like a streamed upload of them
+    dataset_id = fingerprints[0] if len(fingerprints) == 1 else exports_fingerprint(fingerprints, streaming=True)
+    cube = combine_cubes([cube for _, cube, _ in loaded])
+    # One export keeps all of its load info (dates included); streamed ones have none to keep
+    load_info = loaded[0][2] if len(loaded) == 1 else {
+        'source': ','.join(info['source'] for _, _, info in loaded),
+        'seconds': sum(info['seconds'] for _, _, info in loaded),
+        'rows': sum(info['rows'] for _, _, info in loaded),
+    }
+    register_dataset(dataset_id, cube, load_info)
+    return dataset_id
+
+def _sheet_file_name(sheet):
+    return sheet.lower().replace('+', '_').replace(' ', '_') + '.csv'
+
+def write_report_xlsx(tables, target):
+    """Write (sheet, table) pairs into a multi-sheet XLSX (path or file object), one table at a time.
+
+    openpyxl's write-only mode spools every sheet to disk as rows are appended, so
+    only the table being written is ever held in memory.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheets = {sheet: workbook.create_sheet(sheet) for sheet in REPORT_SHEETS}
+    headers = {}
+    for sheet, table in tables:
+        if table.empty:
+            continue
+        worksheet = sheets[sheet]
+        if sheet not in headers:
+            headers[sheet] = list(table.columns)
+            worksheet.append(headers[sheet])
+        table = table.reindex(columns=headers[sheet]).astype(object)
+        for row in table.where(table.notna(), None).itertuples(index=False):
+            worksheet.append(row)
+    workbook.save(target)
+
+def _write_report_csvs(tables, open_sheet):
+    """Append each sheet's tables to the text file returned by open_sheet(sheet), header first"""
+    for sheet, group in itertools.groupby(tables, key=operator.itemgetter(0)):
+        with open_sheet(sheet) as f:
+            header = None
+            for _, table in group:
+                if table.empty:
+                    continue
+                if header is None:
+                    header = list(table.columns)
+                    table.to_csv(f, index=False)
+                else:
+                    table.reindex(columns=header).to_csv(f, index=False, header=False)
+
+def write_report_zip(tables, target):
+    """Write (sheet, table) pairs into a zip (path or file object) holding one CSV per sheet"""
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        _write_report_csvs(tables, lambda sheet: io.TextIOWrapper(
+            archive.open(_sheet_file_name(sheet), 'w'), encoding='utf-8', newline=''
+        ))
+
+def write_report(tables, output=None, csv_dir=None):
+    """Write (sheet, table) pairs to one multi-sheet XLSX and/or a directory of CSVs"""
+    if output and csv_dir:
+        tables = list(tables)
+    if output:
+        write_report_xlsx(tables, output)
+    if csv_dir:
+        os.makedirs(csv_dir, exist_ok=True)
+        _write_report_csvs(tables, lambda sheet: open(
+            os.path.join(csv_dir, _sheet_file_name(sheet)), 'w', newline='', encoding='utf-8'
+        ))
+
+# Full-report download formats: label and MIME type
+EXPORT_FORMATS = {
+    'xlsx': ("Excel workbook (one sheet per batch)", 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'zip': ("Zip of CSV files (one per batch)", 'application/zip'),
+}
+
+def _export_path(dataset_id, fmt):
+    return os.path.join(SNAPSHOT_DIR, f"{dataset_id}.v{SNAPSHOT_VERSION}.{RULES_FINGERPRINT}.report.{fmt}")
+
+def export_report(dataset_id, fmt):
+    """Path of the full Batch 1-5 report of a dataset, writing it next to the snapshots on first request"""
+    path = _export_path(dataset_id, fmt)
+    with profile_stage('export_report') as record:
+        record['cache'] = 'hit' if os.path.exists(path) else 'miss'
+        if record['cache'] == 'miss':
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            writer = write_report_xlsx if fmt == 'xlsx' else write_report_zip
+            writer(iter_report_tables(dataset_id), tmp_path)
+            os.replace(tmp_path, path)
+            evict_snapshots()
+        else:
+            # Touch so the LRU eviction sees this report as recently used
+            os.utime(path)
+    return path
+
+# ========== CACHE WARM-UP ==========
+@st.cache_resource
+def _warmup_executor():
+    return ThreadPoolExecutor(WARMUP_WORKERS, thread_name_prefix='lucknow-warmup')
+
+def _run_warmup_task(storage, dataset_id, progress, func_name, args):
+    with use_storage(storage):
+        try:
+            if func_name is None:
+                get_leaderboards(dataset_id)
+            else:
+                globals()[func_name].warm(dataset_id, *args)
+        except Exception:
+            # The dataset may have been released while its warm-up was queued
+            logger.debug("Warm-up of %s%r failed", func_name, args, exc_info=True)
+        with _registry_lock():
+            progress['done'] += 1
+
+def start_warmup(dataset_id):
+    """Queue every Batch 1-5 summary of a dataset on the background pool, once per dataset.
+
+    Officer views come from the leaderboards, which are built first; every other
+    table is computed into the shared summary cache, so later toggles are hits.
+    The workers get the shared registry and cache handed over, not the session's
+    script run context, so nothing they do reaches the page or its session state.
+    """
+    storage = shared_storage()
+    entry = _dataset_registry()[dataset_id]
+    with _registry_lock():
+        if 'warmup' in entry:
+            return
+        tasks = [(None, ())] + [
+            (func_name, args) for _, _, func_name, args, _ in report_tasks(dataset_id)
+            if hasattr(globals()[func_name], 'warm')
+        ]
+        entry['warmup'] = progress = {'done': 0, 'total': len(tasks)}
     
-    if filtered_df.empty:
-        return pd.DataFrame()
+    executor = _warmup_executor()
+    for func_name, args in tasks:
+        executor.submit(_run_warmup_task, storage, dataset_id, progress, func_name, args)
+
+def warmup_progress(dataset_id):
+    """(done, total) warm-up tasks of a registered dataset; (0, 0) when none was started"""
+    progress = _dataset_registry()[dataset_id].get('warmup', {'done': 0, 'total': 0})
+    return progress['done'], progress['total']
+
+# ========== HISTORY STORE ==========
+# SQLite column holding each cube dimension; 'Snapshot Date' is the day an export was stored for.
+# complaint_counts keeps full cube cells, category_counts the same counts rolled up without
+# officers (a few hundred rows a day), which answers every query not involving an officer.
+HISTORY_COLUMNS = {
+    'Snapshot Date': 'snapshot_date',
+    'MainCategory': 'main_category',
+    'Subcategory': 'subcategory',
+    'Zone Name': 'zone',
+    'Department': 'department',
+    'Assigned User Name': 'officer',
+    'StatusBinary': 'status',
+}
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_date TEXT PRIMARY KEY,
+    dataset_id TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    stored_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS complaint_counts (
+    snapshot_date TEXT NOT NULL,
+    main_category TEXT,
+    subcategory TEXT,
+    zone TEXT,
+    department TEXT,
+    officer TEXT,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_counts_date ON complaint_counts (snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_counts_zone ON complaint_counts (zone, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_counts_category ON complaint_counts (main_category, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_counts_department ON complaint_counts (department, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_counts_officer ON complaint_counts (officer, snapshot_date);
+CREATE TABLE IF NOT EXISTS category_counts (
+    snapshot_date TEXT NOT NULL,
+    main_category TEXT,
+    subcategory TEXT,
+    zone TEXT,
+    department TEXT,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_category_counts_date ON category_counts (snapshot_date);
+"""
+
+@contextlib.contextmanager
+def open_history(path=None):
+    """Connection to the SQLite history store (created on first use); commits on a clean exit"""
+    conn = sqlite3.connect(path or HISTORY_DB)
+    try:
+        # WAL lets dashboard sessions keep reading while an export is being stored
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(HISTORY_SCHEMA)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def store_history(conn, snapshot_date, dataset_id, cube, rows):
+    """Store a dataset's count cube as the snapshot of one day, replacing that day's previous export.
+
+    Exports are cumulative, so the store keeps one count cube per day rather than
+    every complaint row of every day; drill-downs sum counts in SQL either way.
+    """
+    snapshot_date = str(snapshot_date)
+    rollup_dims = [dim for dim in CUBE_DIMENSIONS if dim != 'Assigned User Name']
+    rollup = cube.groupby(rollup_dims, observed=True, dropna=False)['Count'].sum().reset_index()
     
-    # Pivot by Officer and StatusBinary
-    officer_summary = filtered_df.groupby(['Assigned User Name', 'StatusBinary']).size().unstack(fill_value=0)
+    for table, cells in [('complaint_counts', cube), ('category_counts', rollup)]:
+        dims = [col for col in cells.columns if col != 'Count']
+        keys = cells[dims].astype(object)
+        keys = keys.where(keys.notna(), None)
+        columns = ['snapshot_date'] + [HISTORY_COLUMNS[dim] for dim in dims] + ['count']
+        conn.execute(f'DELETE FROM {table} WHERE snapshot_date = ?', (snapshot_date,))
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            (
+                (snapshot_date, *key, count)
+                for key, count in zip(keys.itertuples(index=False, name=None), cells['Count'].tolist())
+            )
+        )
+    conn.execute(
+        'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)',
+        (snapshot_date, dataset_id, int(rows), datetime.datetime.now().isoformat(timespec='seconds'))
+    )
+
+def history_dates(conn):
+    """Stored snapshot dates, oldest first"""
+    return [date for (date,) in conn.execute('SELECT snapshot_date FROM snapshots ORDER BY snapshot_date')]
+
+def history_stored(conn, snapshot_date, dataset_id):
+    """Whether dataset_id is already the stored snapshot of snapshot_date"""
+    row = conn.execute('SELECT dataset_id FROM snapshots WHERE snapshot_date = ?', (str(snapshot_date),)).fetchone()
+    return row is not None and row[0] == dataset_id
+
+def history_values(conn, dim):
+    """Distinct non-missing values of one dimension across the whole history"""
+    column = HISTORY_COLUMNS[dim]
+    table = 'complaint_counts' if dim == 'Assigned User Name' else 'category_counts'
+    query = f'SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column}'
+    return [value for (value,) in conn.execute(query)]
+
+def history_drilldown(conn, dims, filters=None, start=None, end=None,
+                      subtotals=False, total_label=None, total_column='Total'):
+    """drilldown() over the history store: the filtering and group-by run as SQL on the indexes.
+
+    dims and filters use cube dimension names plus 'Snapshot Date'; start and end
+    bound the snapshot dates (inclusive). Only the grouped rows are read into pandas.
+    Each snapshot is a cumulative export, so counts of different dates are never added:
+    without 'Snapshot Date' in dims only the latest snapshot in the range is counted,
+    and grouped by it over several dates there is no total row (and subtotals need
+    'Snapshot Date' as the first dimension).
+    """
+    unknown = [dim for dim in list(dims) + list(filters or {}) if dim not in HISTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}")
+    by_date = 'Snapshot Date' in dims
+    if subtotals and by_date and dims[0] != 'Snapshot Date':
+        raise ValueError("Subtotals would add up snapshots of different dates: group by 'Snapshot Date' first")
     
-    # Ensure both columns exist
-    if 'Open' not in officer_summary.columns:
-        officer_summary['Open'] = 0
-    if 'Resolved' not in officer_summary.columns:
-        officer_summary['Resolved'] = 0
+    date_where, date_params = [], []
+    if start is not None:
+        date_where.append('snapshot_date >= ?')
+        date_params.append(str(start))
+    if end is not None:
+        date_where.append('snapshot_date <= ?')
+        date_params.append(str(end))
+    where, params = [], []
+    for dim, value in (filters or {}).items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        if dim == 'Snapshot Date':
+            date_where.append(f"snapshot_date IN ({', '.join('?' * len(values))})")
+            date_params.extend(str(day) for day in values)
+        else:
+            where.append(f"{HISTORY_COLUMNS[dim]} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if by_date:
+        where, params = date_where + where, date_params + params
+    else:
+        # The latest export in the range already counts every complaint of the earlier ones
+        latest = f"SELECT MAX(snapshot_date) FROM snapshots {'WHERE ' + ' AND '.join(date_where) if date_where else ''}"
+        where, params = [f'snapshot_date = ({latest})'] + where, date_params + params
+    # Like drilldown, rows missing a grouped dimension are left out
+    groups = ', '.join(HISTORY_COLUMNS[dim] for dim in dims)
+    where += [f"{HISTORY_COLUMNS[dim]} IS NOT NULL" for dim in dims]
     
-    # Calculate Total and % Closure
-    officer_summary['Total'] = officer_summary['Open'] + officer_summary['Resolved']
-    officer_summary['% Closure'] = officer_summary.apply(
-        lambda row: (row['Resolved'] / row['Total'] * 100) if row['Total'] > 0 else 0,
-        axis=1
-    ).round(1)
+    table = 'complaint_counts' if 'Assigned User Name' in list(dims) + list(filters or {}) else 'category_counts'
+    query = (
+        f"SELECT {groups}, "
+        "SUM(CASE WHEN status = 'Open' THEN count ELSE 0 END), "
+        "SUM(CASE WHEN status = 'Resolved' THEN count ELSE 0 END) "
+        f"FROM {table} {'WHERE ' + ' AND '.join(where) if where else ''} "
+        f"GROUP BY {groups} ORDER BY {groups}"
+    )
+    counts = pd.DataFrame(conn.execute(query, params).fetchall(), columns=list(dims) + STATUS_COLUMNS)
+    if counts.empty:
+        return pd.DataFrame(columns=STATUS_COLUMNS + [total_column, '% Closure'])
     
-    # Sort by Open (descending)
-    officer_summary = officer_summary.sort_values('Open', ascending=False)
+    if by_date and counts['Snapshot Date'].nunique() > 1:
+        total_label = None
+    counts = counts.set_index(list(dims))
+    counts.columns = pd.Index(STATUS_COLUMNS, name='StatusBinary')
+    return _finish_drilldown(counts, list(dims), subtotals, total_label, total_column)
+
+def history_cube(conn, snapshot_date):
+    """Count cube of one stored snapshot"""
+    columns = ', '.join(HISTORY_COLUMNS[dim] for dim in CUBE_DIMENSIONS)
+    rows = conn.execute(
+        f'SELECT {columns}, count FROM complaint_counts WHERE snapshot_date = ?', (str(snapshot_date),)
+    ).fetchall()
+    return pd.DataFrame(rows, columns=CUBE_DIMENSIONS + ['Count'])
+
+def open_history_dataset(snapshot_date, path=None):
+    """Register a stored snapshot (unless still loaded) and return its id, 'history:<date>:<upload dataset_id>'.
+
+    The id is kept apart from the upload's own, so the same export uploaded again is
+    loaded as an upload, with its dates, rather than taken for the stored cube.
+    """
+    with open_history(path) as conn:
+        row = conn.execute(
+            'SELECT dataset_id, rows FROM snapshots WHERE snapshot_date = ?', (str(snapshot_date),)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No snapshot stored for {snapshot_date}")
+        dataset_id = f"history:{snapshot_date}:{row[0]}"
+        rows = row[1]
+        if dataset_id not in _dataset_registry():
+            start = time.perf_counter()
+            cube = history_cube(conn, snapshot_date)
+            register_dataset(
+                dataset_id, cube, {'source': 'history', 'seconds': time.perf_counter() - start, 'rows': rows},
+                auxiliary=True
+            )
+    return dataset_id
+
+def export_date(dataset_id):
+    """Day a registered dataset was exported: its latest 'Created Date', or today when it has none"""
+    return get_load_info(dataset_id).get('latest_created') or datetime.date.today()
+
+def save_to_history(dataset_id, snapshot_date=None, path=None):
+    """Store a registered dataset in the history store as the snapshot of snapshot_date.
+
+    Without a date the export's own (export_date) is used, so an old export uploaded
+    today does not replace today's snapshot.
+    """
+    snapshot_date = snapshot_date or export_date(dataset_id)
+    with open_history(path) as conn:
+        if not history_stored(conn, snapshot_date, dataset_id):
+            store_history(conn, snapshot_date, dataset_id, get_cube(dataset_id), get_load_info(dataset_id)['rows'])
+    return str(snapshot_date)
+
+# ========== JSON API ==========
+# Query parameter names accepted by the API, and the cube dimensions they stand for
+API_DIMENSIONS = {
+    'category': 'MainCategory',
+    'subcategory': 'Subcategory',
+    'zone': 'Zone Name',
+    'department': 'Department',
+    'officer': 'Assigned User Name',
+}
+# Query parameters that are not dimension filters
+API_OPTIONS = {'dataset', 'by', 'top'}
+
+def _json_records(table):
+    """Rows of a table as JSON-ready dicts, missing values as None"""
+    table = table.astype(object)
+    return table.where(table.notna(), None).to_dict('records')
+
+def api_filters(params):
+    """{cube dimension: value or list of values} from parsed query parameters such as zone=Zone 1"""
+    unknown = sorted(set(params) - set(API_DIMENSIONS) - API_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)}")
+    return {
+        API_DIMENSIONS[name]: values[0] if len(values) == 1 else values
+        for name, values in params.items() if name in API_DIMENSIONS
+    }
+
+def api_summary(entry, params):
+    """Open / Resolved / Total / % Closure grouped by ?by=zone,category (default: category)"""
+    names = params.get('by', ['category'])[0].split(',')
+    unknown = [name for name in names if name not in API_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Cannot group by: {', '.join(unknown)}")
     
-    # Reset index to make Officer Name a column
-    officer_summary = officer_summary.reset_index()
-    officer_summary.rename(columns={'Assigned User Name': 'Officer Name'}, inplace=True)
+    table = drilldown(entry['cube'], [API_DIMENSIONS[name] for name in names], api_filters(params))
+    rows = [] if table.empty else _json_records(
+        table.reset_index().rename(columns={API_DIMENSIONS[name]: name for name in names})
+    )
+    opened, resolved = int(table['Open'].sum()), int(table['Resolved'].sum())
+    return {
+        'by': names,
+        'rows': rows,
+        'total': {
+            'Open': opened,
+            'Resolved': resolved,
+            'Total': opened + resolved,
+            '% Closure': round(resolved / (opened + resolved) * 100, 1) if opened + resolved else 0.0,
+        },
+    }
+
+def api_officers(entry, params):
+    """Ranked LMC officers of one ?zone= and/or one ?category= (all officers, or the first ?top=)"""
+    api_filters(params)
+    # Rankings are precomputed per zone, category and pair only; other filters would be ignored
+    unsupported = sorted(name for name in params if name in API_DIMENSIONS and name not in ('zone', 'category'))
+    if unsupported:
+        raise ValueError(f"Officer rankings cannot be filtered by: {', '.join(unsupported)}")
+    if any(len(params.get(name, [])) > 1 for name in ('zone', 'category')):
+        raise ValueError("Pass one zone and/or one category")
+    zone, category = params.get('zone', [None])[0], params.get('category', [None])[0]
+    if zone is None and category is None:
+        raise ValueError("Pass zone and/or category")
+    top = params.get('top', [None])[0]
+    if top is not None and not (top.isdigit() and int(top) > 0):
+        raise ValueError("top must be a positive whole number")
+    top_k = int(top) if top is not None else None
+    board = _entry_leaderboards(entry).get((zone, category))
+    if board is None:
+        return {'rows': []}
+    return {'rows': _json_records(board.head(top_k) if top_k else board)}
+
+API_ROUTES = {'/summary': api_summary, '/officers': api_officers}
+
+def api_response(registry, path, params, if_none_match=None):
+    """(status, ETag, payload) of one API request; payload is None for 304 Not Modified.
+
+    The ETag of a query is derived from a hash of the dataset_id, the rules
+    fingerprint and the normalized query, so a client polling with If-None-Match
+    gets a 304 without the query being run until a new export (or rules config) is loaded. Auxiliary datasets (date windows and
+    comparison baselines) are not listed and never the default, but can be queried.
+    """
+    entries = list(registry.items())
+    if path == '/datasets':
+        datasets = [
+            {'dataset': dataset_id, 'rows': entry['info'].get('rows'), 'source': entry['info'].get('source')}
+            for dataset_id, entry in entries if not entry.get('auxiliary')
+        ]
+        etag = '"%s"' % hashlib.sha256(','.join(d['dataset'] for d in datasets).encode()).hexdigest()[:32]
+        return (304, etag, None) if if_none_match == etag else (200, etag, {'datasets': datasets})
+    if path not in API_ROUTES:
+        return 404, None, {'error': f"Unknown path {path}; use /datasets, /summary or /officers"}
     
-    # Add Rank column
-    officer_summary.insert(0, 'Rank', range(1, len(officer_summary) + 1))
+    # Without ?dataset= the most recently loaded main dataset is used
+    dataset_id = params.get('dataset', [None])[0] or next(
+        (dataset_id for dataset_id, entry in reversed(entries) if not entry.get('auxiliary')), None
+    )
+    entry = registry.get(dataset_id)
+    if entry is None:
+        return 404, None, {'error': f"Unknown dataset {dataset_id}"}
     
-    # Reorder columns
-    return officer_summary[['Rank', 'Officer Name', 'Open', 'Resolved', 'Total', '% Closure']]
+    query = json.dumps([path, sorted((k, sorted(v)) for k, v in params.items() if k != 'dataset')])
+    etag = '"%s-%s"' % (
+        hashlib.sha256(f'{dataset_id}:{RULES_FINGERPRINT}'.encode()).hexdigest()[:32],
+        hashlib.sha256(query.encode()).hexdigest()[:16]
+    )
+    if if_none_match in (etag, '*'):
+        return 304, etag, None
+    try:
+        payload = API_ROUTES[path](entry, params)
+    except ValueError as e:
+        return 400, None, {'error': str(e)}
+    return 200, etag, dict(payload, dataset=dataset_id)
 
-@st.cache_data
-def generate_officer_performance_by_zone(df, zone):
-    """Generate officer-wise ticket summary for a specific Zone (LMC only)"""
-    # Filter: LMC department + Zone
-    filtered_df = df[
-        (df['Department'] == 'LMC') & 
-        (df['Zone Name'] == zone)
-    ]
+def make_api_handler(registry):
+    """http.server request handler class answering API queries from a dataset registry"""
+    class ApiHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, etag, payload = api_response(
+                registry, url.path.rstrip('/') or '/', parse_qs(url.query), self.headers.get('If-None-Match')
+            )
+            body = json.dumps(payload).encode() if payload is not None else b''
+            self.send_response(status)
+            if etag:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+            if payload is not None:
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            logger.info("API %s %s", self.address_string(), format % args)
     
-    if filtered_df.empty:
-        return pd.DataFrame()
+    return ApiHandler
+
+def serve_api(registry, host=API_HOST, port=8502):
+    """Start the JSON API on a daemon thread and return its server"""
+    server = http.server.ThreadingHTTPServer((host, port), make_api_handler(registry))
+    threading.Thread(target=server.serve_forever, name='lucknow-api', daemon=True).start()
+    logger.info("JSON API listening on http://%s:%d", host, server.server_port)
+    return server
+
+@st.cache_resource
+def start_api_server(host, port):
+    """Start the JSON API once per process over the registry every session shares"""
+    return serve_api(_shared_dataset_registry(), host, port)
+
+# ========== COMPARISON: CHANGES SINCE AN EARLIER EXPORT ==========
+DIFF_GROUPS = {
+    "Main Category": ('MainCategory',),
+    "Zone": ('Zone Name',),
+    "Department": ('Department',),
+    "Officer": ('Assigned User Name',),
+    "Zone + Category": ('Zone Name', 'MainCategory'),
+}
+
+@st.fragment
+@profiled_section('diff')
+def render_diff(dataset_id, baseline_id):
+    hold_datasets(dataset_id, baseline_id)
+    st.subheader("🔀 Changes Since the Earlier Export")
+    
+    # Headline numbers from the category view, which covers every complaint
+    overall = generate_snapshot_diff(dataset_id, baseline_id, DIFF_GROUPS["Main Category"])
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Δ Total", f"{int(overall['Δ Total'].sum()):+,}")
+    with col2:
+        st.metric("Net Resolved", f"{int(overall['Newly Resolved'].sum() - overall['Reopened'].sum()):,}")
+    with col3:
+        st.metric("Δ Open", f"{int(overall['Δ Open'].sum()):+,}")
+    with col4:
+        st.metric("Open Now", f"{int(overall['Open Now'].sum()):,}")
+    
+    group_by = st.radio("Break down by", list(DIFF_GROUPS), horizontal=True, key="diff_group_by")
+    changes = generate_snapshot_diff(dataset_id, baseline_id, DIFF_GROUPS[group_by])
+    if group_by == "Officer":
+        changes = changes.sort_values(['Newly Resolved', 'Reopened'], ascending=[False, True], kind='stable')
     
-    # Pivot by Officer and StatusBinary
-    officer_summary = filtered_df.groupby(['Assigned User Name', 'StatusBinary']).size().unstack(fill_value=0)
+    if changes.empty:
+        st.info("No changes between the two exports")
+    else:
+        st.caption(
+            "Net changes per group: Δ Total is new complaints less those no longer listed, and "
+            "where some tickets were resolved and others reopened, only the balance shows as "
+            "Newly Resolved or Reopened"
+        )
+        st.dataframe(changes, use_container_width=True, hide_index=False)
+
+# ========== DATE WINDOW: SIDEBAR FILTER ==========
+# Preset windows, in days up to the latest date in the export (None: pick the dates)
+WINDOW_PRESETS = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Custom range": None}
+
+def select_date_window(dataset_id):
+    """Sidebar controls of the date filter; returns the dataset_id of the chosen window, or None"""
+    ranges = {basis: dataset_date_range(dataset_id, basis) for basis in DATE_COLUMNS}
+    ranges = {basis: bounds for basis, bounds in ranges.items() if bounds is not None}
+    if not ranges:
+        st.sidebar.caption(
+            "This upload has no dates to filter on (streamed uploads keep none, and the export "
+            f"needs a {' or '.join(repr(col) for col in DATE_COLUMNS.values())} column)"
+        )
+        return None
     
-    # Ensure both columns exist
-    if 'Open' not in officer_summary.columns:
-        officer_summary['Open'] = 0
-    if 'Resolved' not in officer_summary.columns:
-        officer_summary['Resolved'] = 0
+    basis = st.sidebar.radio("Complaints", list(ranges), format_func=lambda b: f"{b} in", horizontal=True,
+                             key="window_basis")
+    first, last = ranges[basis]
+    preset = st.sidebar.selectbox("Window", list(WINDOW_PRESETS), key="window_preset")
+    if WINDOW_PRESETS[preset] is None:
+        picked = st.sidebar.date_input("Dates", value=(first, last), min_value=first, max_value=last,
+                                       key="window_dates")
+        # A range being picked has only its start date until the end is clicked
+        start, end = (tuple(picked) * 2)[:2] if picked else (first, last)
+    else:
+        start, end = max(first, last - datetime.timedelta(days=WINDOW_PRESETS[preset] - 1)), last
+    st.sidebar.caption(f"{start:%d %b %Y} – {end:%d %b %Y} ({DATE_COLUMNS[basis]})")
+    return open_window_dataset(dataset_id, basis, start, end)
+
+# ========== BATCH 1: MAIN CATEGORY SUMMARY ==========
+@st.fragment
+@profiled_section('batch1')
+def render_batch1(dataset_id):
+    hold_datasets(dataset_id)
+    summary_table = generate_status_summary(dataset_id)
+    
+    st.subheader("📈 BATCH 1: Status-wise Summary by Main Category")
+    st.dataframe(
+        summary_table.round(1),
+        use_container_width=True,
+        hide_index=False,
+        column_config={
+            '% Closure': st.column_config.NumberColumn(
+                "Closure %",
+                format="%.1f%%"
+            )
+        }
+    )
+    
+    # Key metrics
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Open", f"{int(summary_table.loc['**TOTAL**', 'Open']):,}")
+    with col2:
+        st.metric("Total Resolved", f"{int(summary_table.loc['**TOTAL**', 'Resolved']):,}")
+    with col3:
+        st.metric("Total Complaints", f"{int(summary_table.loc['**TOTAL**', 'Grand Total']):,}")
+    with col4:
+        st.metric("Overall Closure %", f"{summary_table.loc['**TOTAL**', '% Closure']:.1f}%")
+
+# ========== BATCH 2: SUBCATEGORY DRILL-DOWN ==========
+@st.fragment
+@profiled_section('batch2')
+def render_batch2(dataset_id, main_categories):
+    hold_datasets(dataset_id)
+    st.subheader("🔍 BATCH 2: Subcategory Drill-Down by Main Category")
     
-    # Calculate Total and % Closure
-    officer_summary['Total'] = officer_summary['Open'] + officer_summary['Resolved']
-    officer_summary['% Closure'] = officer_summary.apply(
-        lambda row: (row['Resolved'] / row['Total'] * 100) if row['Total'] > 0 else 0,
-        axis=1
-    ).round(1)
+    # One category at a time, so only the viewed breakdown is computed
+    category_counts = get_cube(dataset_id).groupby('MainCategory', observed=True)['Count'].sum()
+    main_cat = st.radio(
+        "🏷️ Select Main Category",
+        options=main_categories,
+        format_func=lambda cat: f"{cat} ({category_counts[cat]})",
+        horizontal=True,
+        key="batch2_category"
+    )
     
-    # Sort by Open (descending)
-    officer_summary = officer_summary.sort_values('Open', ascending=False)
+    st.write(f"### {main_cat} - Subcategory Breakdown")
     
-    # Reset index to make Officer Name a column
-    officer_summary = officer_summary.reset_index()
-    officer_summary.rename(columns={'Assigned User Name': 'Officer Name'}, inplace=True)
+    # Generate subcategory summary (cached)
+    sub_summary = generate_subcategory_summary(dataset_id, main_cat)
     
-    # Add Rank column
-    officer_summary.insert(0, 'Rank', range(1, len(officer_summary) + 1))
+    # Display table
+    st.dataframe(
+        sub_summary.round(1),
+        use_container_width=True,
+        hide_index=False,
+        column_config={
+            '% Closure': st.column_config.NumberColumn(
+                "Closure %",
+                format="%.1f%%"
+            )
+        }
+    )
     
-    # Reorder columns
-    return officer_summary[['Rank', 'Officer Name', 'Open', 'Resolved', 'Total', '% Closure']]
+    # Metrics for this category
+    cat_total = sub_summary.loc[f'**{main_cat} Total**']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Open", f"{int(cat_total['Open']):,}")
+    with col2:
+        st.metric("Resolved", f"{int(cat_total['Resolved']):,}")
+    with col3:
+        st.metric("Total", f"{int(cat_total['Grand Total']):,}")
+    with col4:
+        st.metric("Closure %", f"{cat_total['% Closure']:.1f}%")
 
-@st.cache_data
-def generate_officer_performance_category_zone(df, main_category, zone):
-    """Generate officer-wise ticket summary for specific MainCategory AND Zone (LMC only)"""
-    # Filter: LMC department + MainCategory + Zone
-    filtered_df = df[
-        (df['Department'] == 'LMC') & 
-        (df['MainCategory'] == main_category) & 
-        (df['Zone Name'] == zone)
-    ]
+# ========== BATCH 3: ZONE-WISE DRILL-DOWN WITH TOGGLE ==========
+@st.fragment
+@profiled_section('batch3')
+def render_batch3(dataset_id, main_categories):
+    hold_datasets(dataset_id)
+    st.subheader("🗺️ BATCH 3: Zone-wise Drill-Down (Toggle by Category & Zone)")
     
-    if filtered_df.empty:
-        return pd.DataFrame()
+    # Get unique zones
+    zones = sorted(get_cube(dataset_id)['Zone Name'].dropna().unique())
     
-    # Pivot by Officer and StatusBinary
-    officer_summary = filtered_df.groupby(['Assigned User Name', 'StatusBinary']).size().unstack(fill_value=0)
+    # Create two columns for dropdown filters
+    col1, col2 = st.columns(2)
     
-    # Ensure both columns exist
-    if 'Open' not in officer_summary.columns:
-        officer_summary['Open'] = 0
-    if 'Resolved' not in officer_summary.columns:
-        officer_summary['Resolved'] = 0
+    with col1:
+        selected_category = st.selectbox(
+            "🏷️ Select Main Category",
+            options=main_categories,
+            key="batch3_category"
+        )
     
-    # Calculate Total and % Closure
-    officer_summary['Total'] = officer_summary['Open'] + officer_summary['Resolved']
-    officer_summary['% Closure'] = officer_summary.apply(
-        lambda row: (row['Resolved'] / row['Total'] * 100) if row['Total'] > 0 else 0,
-        axis=1
-    ).round(1)
+    with col2:
+        selected_zone = st.selectbox(
+            "🗺️ Select Zone",
+            options=zones,
+            key="batch3_zone"
+        )
     
-    # Sort by Open (descending)
-    officer_summary = officer_summary.sort_values('Open', ascending=False)
+    # Generate zone+category summary (cached) - INSTANT TOGGLE NOW!
+    zone_summary = generate_zone_subcategory_summary(dataset_id, selected_category, selected_zone)
     
-    # Reset index to make Officer Name a column
-    officer_summary = officer_summary.reset_index()
-    officer_summary.rename(columns={'Assigned User Name': 'Officer Name'}, inplace=True)
+    if not zone_summary.empty:
+        st.write(f"### {selected_category} - Zone {selected_zone} - Subcategory Breakdown")
+        
+        # Display table
+        st.dataframe(
+            zone_summary.round(1),
+            use_container_width=True,
+            hide_index=False,
+            column_config={
+                '% Closure': st.column_config.NumberColumn(
+                    "Closure %",
+                    format="%.1f%%"
+                )
+            }
+        )
+        
+        # Metrics for this zone+category combo
+        zone_total = zone_summary.iloc[-1]  # Last row is the total
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Open", f"{int(zone_total['Open']):,}")
+        with col2:
+            st.metric("Resolved", f"{int(zone_total['Resolved']):,}")
+        with col3:
+            st.metric("Total", f"{int(zone_total['Grand Total']):,}")
+        with col4:
+            st.metric("Closure %", f"{zone_total['% Closure']:.1f}%")
+    else:
+        st.warning(f"⚠️ No data found for {selected_category} in Zone {selected_zone}")
+
+# ========== BATCH 4: DEPARTMENT-WISE DRILL-DOWN WITH TOGGLE ==========
+@st.fragment
+@profiled_section('batch4')
+def render_batch4(dataset_id):
+    hold_datasets(dataset_id)
+    st.subheader("🏢 BATCH 4: Department-wise Drill-Down (Toggle by Department)")
     
-    # Add Rank column
-    officer_summary.insert(0, 'Rank', range(1, len(officer_summary) + 1))
+    # Get unique departments
+    departments = sorted(get_cube(dataset_id)['Department'].unique())
     
-    # Reorder columns
-    return officer_summary[['Rank', 'Officer Name', 'Open', 'Resolved', 'Total', '% Closure']]
+    # Create dropdown filter
+    selected_department = st.selectbox(
+        "🏢 Select Department",
+        options=departments,
+        key="batch4_department"
+    )
+    
+    # Generate department+category summary (cached) - INSTANT TOGGLE NOW!
+    dept_summary = generate_department_category_summary(dataset_id, selected_department)
+    
+    if not dept_summary.empty:
+        st.write(f"### {selected_department} - Main Category Breakdown")
+        
+        # Display table
+        st.dataframe(
+            dept_summary.round(1),
+            use_container_width=True,
+            hide_index=False,
+            column_config={
+                '% Closure': st.column_config.NumberColumn(
+                    "Closure %",
+                    format="%.1f%%"
+                )
+            }
+        )
+        
+        # Metrics for this department
+        dept_total = dept_summary.iloc[-1]  # Last row is the total
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Open", f"{int(dept_total['Open']):,}")
+        with col2:
+            st.metric("Resolved", f"{int(dept_total['Resolved']):,}")
+        with col3:
+            st.metric("Total", f"{int(dept_total['Grand Total']):,}")
+        with col4:
+            st.metric("Closure %", f"{dept_total['% Closure']:.1f}%")
+    else:
+        st.warning(f"⚠️ No data found for {selected_department}")
+
+# ========== BATCH 5: OFFICER PERFORMANCE TRACKING ==========
+# Rows shown per leaderboard (None shows every officer)
+LEADERBOARD_TOP_K = [10, 25, 50, 100, None]
+
+def render_officer_table(board, caption, closure_label):
+    """One officer leaderboard with its summary metrics; board holds every ranked officer"""
+    top_k = st.session_state.get('batch5_top_k')
+    st.write(f"{caption} | **Total Open: {board['Open'].sum():,}** | **Officers: {len(board)}**")
+    
+    st.dataframe(
+        board.head(top_k) if top_k else board,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'Rank': st.column_config.NumberColumn("Rank", width=50),
+            'Officer Name': st.column_config.TextColumn("Officer Name", width=250),
+            'Open': st.column_config.NumberColumn("Open", width=80),
+            'Resolved': st.column_config.NumberColumn("Resolved", width=80),
+            'Total': st.column_config.NumberColumn("Total", width=80),
+            '% Closure': st.column_config.NumberColumn("% Closure", width=100, format="%.1f%%")
+        }
+    )
+    
+    # Summary metrics
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Open", f"{board['Open'].sum():,}")
+    with col2:
+        st.metric("Total Resolved", f"{board['Resolved'].sum():,}")
+    with col3:
+        st.metric("Active Officers", len(board))
+    with col4:
+        avg_closure = (board['Resolved'].sum() / board['Total'].sum() * 100) if board['Total'].sum() > 0 else 0
+        st.metric(closure_label, f"{avg_closure:.1f}%")
+
+@st.fragment
+@profiled_section('batch5')
+def render_batch5(dataset_id, main_categories):
+    hold_datasets(dataset_id)
+    st.subheader("👨‍💼 BATCH 5: LMC Officer Performance - Open Ticket Tracking")
+    
+    st.markdown("**Filter by Zone OR Main Category to see officer-wise open ticket distribution**")
+    
+    # Get unique zones for LMC
+    cube = get_cube(dataset_id)
+    lmc_cube = cube[cube['Department'] == 'LMC']
+    zones_lmc = sorted(lmc_cube['Zone Name'].dropna().unique())
+    
+    # Every view is a lookup into leaderboards built once per dataset
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        view = st.radio(
+            "View",
+            ["📍 By Zone", "🏷️ By Main Category", "🎯 By Zone + Category"],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="batch5_view"
+        )
+    with col2:
+        st.selectbox(
+            "Officers shown",
+            options=LEADERBOARD_TOP_K,
+            format_func=lambda k: f"Top {k}" if k else "All",
+            key="batch5_top_k"
+        )
+    
+    # ========== VIEW: FILTER BY ZONE ==========
+    if view == "📍 By Zone":
+        st.write("### Officer Performance - Zone Open Tickets")
+        
+        selected_zone = st.selectbox(
+            "🗺️ Select Zone",
+            options=zones_lmc,
+            key="batch5_zone"
+        )
+        
+        officer_perf_zone = generate_officer_performance_by_zone(dataset_id, selected_zone)
+        
+        if not officer_perf_zone.empty:
+            render_officer_table(officer_perf_zone, f"**Zone: {selected_zone}**", "Zone Closure %")
+        else:
+            st.warning(f"⚠️ No LMC complaints found for Zone {selected_zone}")
+    
+    # ========== VIEW: FILTER BY MAIN CATEGORY ==========
+    elif view == "🏷️ By Main Category":
+        st.write("### Officer Performance - Main Category Open Tickets")
+        
+        selected_category = st.selectbox(
+            "🏷️ Select Main Category",
+            options=main_categories,
+            key="batch5_category"
+        )
+        
+        officer_perf_category = generate_officer_performance_by_category(dataset_id, selected_category)
+        
+        if not officer_perf_category.empty:
+            render_officer_table(officer_perf_category, f"**Category: {selected_category}**", "Category Closure %")
+        else:
+            st.warning(f"⚠️ No LMC complaints found in category {selected_category}")
+    
+    # ========== VIEW: FILTER BY ZONE + CATEGORY ==========
+    else:
+        st.write("### Officer Performance - Zone + Category Open Tickets")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            selected_zone_combo = st.selectbox(
+                "🗺️ Select Zone",
+                options=zones_lmc,
+                key="batch5_zone_combo"
+            )
+        
+        with col2:
+            selected_category_combo = st.selectbox(
+                "🏷️ Select Main Category",
+                options=main_categories,
+                key="batch5_category_combo"
+            )
+        
+        officer_perf_combo = generate_officer_performance_category_zone(
+            dataset_id, selected_category_combo, selected_zone_combo
+        )
+        
+        if not officer_perf_combo.empty:
+            render_officer_table(
+                officer_perf_combo,
+                f"**Zone: {selected_zone_combo} | Category: {selected_category_combo}**",
+                "Combo Closure %"
+            )
+        else:
+            st.warning(f"⚠️ No LMC complaints found for Zone {selected_zone_combo} in category {selected_category_combo}")
+
+# ========== HISTORY: DRILL-DOWN ACROSS STORED EXPORTS ==========
+# Dimensions the history drill-down can group by, in display order
+HISTORY_GROUPS = ['Snapshot Date', 'MainCategory', 'Subcategory', 'Zone Name', 'Department', 'Assigned User Name']
+
+@st.fragment
+@profiled_section('history')
+def render_history():
+    st.subheader("📚 HISTORY: Drill-down Across Stored Exports")
+    
+    with open_history() as conn:
+        dates = history_dates(conn)
+        if not dates:
+            st.info("No exports stored yet - uploads are added here once loaded")
+            return
+        
+        st.caption(f"{len(dates)} stored export(s), {dates[0]} to {dates[-1]}")
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if len(dates) > 1:
+                start, end = st.select_slider(
+                    "📅 Snapshot dates",
+                    options=dates,
+                    value=(dates[0], dates[-1]),
+                    key="history_dates"
+                )
+            else:
+                start = end = dates[0]
+        
+        with col2:
+            group_by = st.multiselect(
+                "📊 Group by",
+                options=HISTORY_GROUPS,
+                default=['Snapshot Date', 'MainCategory'],
+                key="history_group_by"
+            )
+        
+        filters = {}
+        for column, (dim, label) in zip(st.columns(3), [
+            ('MainCategory', "🏷️ Main Category"), ('Zone Name', "🗺️ Zone"), ('Department', "🏢 Department")
+        ]):
+            with column:
+                selected = st.multiselect(label, options=history_values(conn, dim), key=f"history_{dim}")
+            if selected:
+                filters[dim] = selected
+        
+        if not group_by:
+            st.warning("⚠️ Pick at least one dimension to group by")
+            return
+        
+        history_table = history_drilldown(conn, group_by, filters, start, end, total_label='**TOTAL**')
+    
+    if 'Snapshot Date' not in group_by:
+        # Every export counts all complaints up to its day, so snapshots are not added up
+        st.caption(f"Counts of the latest snapshot in the range, {end}")
+    if history_table.empty:
+        st.warning("⚠️ No complaints match these filters")
+        return
+    
+    st.dataframe(
+        history_table.rename_axis(group_by).reset_index(),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            '% Closure': st.column_config.NumberColumn("% Closure", format="%.1f%%")
+        }
+    )
+
+# ========== DOWNLOADS ==========
+@st.fragment
+@profiled_section('downloads')
+def render_downloads(dataset_id):
+    hold_datasets(dataset_id)
+    st.subheader("📥 Download Reports")
+    st.caption("Every Batch 1-5 table: all main categories, zones, departments and officers")
+    
+    fmt = st.radio(
+        "Format",
+        list(EXPORT_FORMATS),
+        format_func=lambda f: EXPORT_FORMATS[f][0],
+        horizontal=True,
+        key="export_format"
+    )
+    
+    # Nothing is generated until asked for; a report already written for this dataset is reused
+    ready = st.session_state.get('export_ready') == (dataset_id, fmt)
+    if not ready and not st.button("📄 Prepare full report", key="prepare_export"):
+        return
+    with st.spinner("Writing report..."):
+        path = export_report(dataset_id, fmt)
+    st.session_state['export_ready'] = (dataset_id, fmt)
+    
+    with open(path, 'rb') as f:
+        st.download_button(
+            label="📥 Download full report",
+            data=f,
+            file_name=f"complaints_report.{fmt}",
+            mime=EXPORT_FORMATS[fmt][1]
+        )
+
+@st.fragment(run_every=1.0)
+def render_warmup_progress(dataset_id):
+    """Sidebar progress of the background warm-up; reruns the page once it completes"""
+    hold_datasets(dataset_id)
+    done, total = warmup_progress(dataset_id)
+    if done >= total:
+        st.rerun()
+    st.progress(done / total, text=f"⏳ Precomputing summaries: {done}/{total}")
+
+@st.fragment(run_every=2.0)
+def render_profile_panel():
+    """Timings, cache hits and memory deltas of every stage of the latest run of each section.
+
+    A fragment of its own that refreshes itself, so the records of section (fragment)
+    reruns show up without a full rerun of the page.
+    """
+    records = list(profile_records())
+    with st.expander("⏱️ Performance profile (latest run of each section)", expanded=True):
+        if not records:
+            st.caption("Nothing recorded yet")
+            return
+        
+        profile = pd.DataFrame(records).drop(columns=['session'])
+        sections = profile[profile['kind'] == 'section']
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Section time", f"{sections['seconds'].sum():.3f}s")
+        with col2:
+            st.metric("Cache hits", int((profile['cache'] == 'hit').sum()))
+        with col3:
+            st.metric("Cache misses", int((profile['cache'] == 'miss').sum()))
+        
+        profile['rss_delta_mb'] = profile['rss_delta_bytes'] / 2**20
+        st.dataframe(
+            profile[['section', 'stage', 'kind', 'cache', 'seconds', 'rss_delta_mb']],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'seconds': st.column_config.NumberColumn("Seconds", format="%.4f"),
+                'rss_delta_mb': st.column_config.NumberColumn("RSS Δ (MiB)", format="%.2f")
+            }
+        )
+    
+    stats = result_cache_stats()
+    with st.expander("🗄️ Result cache (all sessions)"):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Memory", f"{stats['bytes'].sum() / 2**20:.1f} / {RESULT_CACHE_MAX_BYTES / 2**20:.0f} MiB")
+        with col2:
+            st.metric("Entries", f"{int(stats['entries'].sum()):,}")
+        with col3:
+            st.metric("Hits / misses", f"{int(stats['hits'].sum()):,} / {int(stats['misses'].sum()):,}")
+        with col4:
+            st.metric("Evicted / expired", f"{int(stats['evictions'].sum()):,} / {int(stats['expirations'].sum()):,}")
+        stats['mb'] = stats.pop('bytes') / 2**20
+        st.dataframe(
+            stats,
+            use_container_width=True,
+            column_config={'mb': st.column_config.NumberColumn("MiB", format="%.3f")}
+        )
 
 def main():
     st.set_page_config(page_title="Complaints Dashboard - Status Summary", layout="wide")
     
     st.title("📊 Complaints Status Summary Dashboard")
     st.markdown("---")
+    reset_profile()
+    if API_PORT:
+        start_api_server(API_HOST, int(API_PORT))
     
     # File upload
-    uploaded_file = st.file_uploader("Upload XLSX file", type=['xlsx'], help="Upload your complaints data")
+    uploaded_files = st.file_uploader(
+        "Upload complaints export(s)",
+        type=UPLOAD_TYPES,
+        accept_multiple_files=True,
+        help="XLSX, CSV or gzipped CSV exports; several files (e.g. one per zone or department) "
+             "are merged into one dataset, each complaint ID counted once"
+    )
+    # Off by default: matching complaint IDs still costs more than re-enriching a whole export
+    # (see the merge_incremental and rebuild_next_export stages of benchmark.py)
+    incremental = st.sidebar.checkbox(
+        "Incremental update",
+        value=False,
+        help=f"Diff a new export against the previous one by '{COMPLAINT_ID_COLUMN}' and only process changed rows"
+    )
+    streaming = st.sidebar.checkbox(
+        "Low-memory streaming mode",
+        value=False,
+        help="Fold rows into summary counts chunk by chunk for very large exports (no snapshot is kept; "
+             "several files are summed without removing complaints listed in more than one)"
+    )
+    save_history = HISTORY_DB is not None and st.sidebar.checkbox(
+        "Save uploads to history",
+        value=True,
+        help="Store each loaded export in the history database as the snapshot of the day it was exported "
+             "(its latest Created Date)"
+    )
+    compare = st.sidebar.checkbox(
+        "Compare with an earlier export",
+        value=False,
+        help="Show new, newly resolved and reopened complaints since an earlier export"
+    )
+    baseline_file = baseline_date = None
+    if compare:
+        stored_dates = []
+        if HISTORY_DB:
+            with open_history() as conn:
+                stored_dates = history_dates(conn)[::-1]
+        if stored_dates:
+            baseline_date = st.sidebar.selectbox(
+                "Baseline",
+                options=[None] + stored_dates,
+                format_func=lambda d: "Upload an earlier export" if d is None else f"Stored snapshot {d}",
+                key="baseline_date"
+            )
+        if baseline_date is None:
+            baseline_file = st.sidebar.file_uploader("Earlier export", type=UPLOAD_TYPES, key="baseline_file")
+    date_window = st.sidebar.checkbox(
+        "Filter by date",
+        value=False,
+        help="Summarize only the complaints created (or resolved) within a date window"
+    )
+    show_profile = st.sidebar.checkbox("Show performance profile", value=False)
     
-    if uploaded_file is not None:
+    if uploaded_files:
         try:
-            # Read Excel (cached)
-            @st.cache_data
-            def load_excel(file):
-                return pd.read_excel(file)
-            
-            df = load_excel(uploaded_file)
-            st.success(f"✅ Loaded {len(df)} records")
-            
-            # Step 1: Add MainCategory
-            df_processed = add_main_category(df.copy())
-            
-            # Step 2: Add StatusBinary
-            df_processed = add_status_binary(df_processed)
-            
-            # Step 3: Add Department
-            df_processed = add_department(df_processed)
-            
-            # Generate summary
-            summary_table = generate_status_summary(df_processed)
-            
-            # ========== BATCH 1: MAIN CATEGORY SUMMARY ==========
-            st.subheader("📈 BATCH 1: Status-wise Summary by Main Category")
-            st.dataframe(
-                summary_table.round(1),
-                use_container_width=True,
-                hide_index=False,
-                column_config={
-                    '% Closure': st.column_config.NumberColumn(
-                        "Closure %",
-                        format="%.1f%%"
-                    )
-                }
-            )
-            
-            # Key metrics
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Total Open", f"{int(summary_table.loc['**TOTAL**', 'Open']):,}")
-            with col2:
-                st.metric("Total Resolved", f"{int(summary_table.loc['**TOTAL**', 'Resolved']):,}")
-            with col3:
-                st.metric("Total Complaints", f"{int(summary_table.loc['**TOTAL**', 'Grand Total']):,}")
-            with col4:
-                st.metric("Overall Closure %", f"{summary_table.loc['**TOTAL**', '% Closure']:.1f}%")
-            
-            st.markdown("---")
-            
-            # ========== BATCH 2: SUBCATEGORY DRILL-DOWN ==========
-            st.subheader("🔍 BATCH 2: Subcategory Drill-Down by Main Category")
-            
-            # Get unique MainCategories (excluding TOTAL row)
-            main_categories = sorted(df_processed['MainCategory'].unique())
-            
-            # Create tabs for each MainCategory
-            tabs = st.tabs([f"{cat} ({len(df_processed[df_processed['MainCategory'] == cat])})" for cat in main_categories])
-            
-            for tab, main_cat in zip(tabs, main_categories):
-                with tab:
-                    st.write(f"### {main_cat} - Subcategory Breakdown")
-                    
-                    # Generate subcategory summary (cached)
-                    sub_summary = generate_subcategory_summary(df_processed, main_cat)
-                    
-                    # Display table
-                    st.dataframe(
-                        sub_summary.round(1),
-                        use_container_width=True,
-                        hide_index=False,
-                        column_config={
-                            '% Closure': st.column_config.NumberColumn(
-                                "Closure %",
-                                format="%.1f%%"
-                            )
-                        }
-                    )
-                    
-                    # Metrics for this category
-                    cat_total = sub_summary.loc[f'**{main_cat} Total**']
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Open", f"{int(cat_total['Open']):,}")
-                    with col2:
-                        st.metric("Resolved", f"{int(cat_total['Resolved']):,}")
-                    with col3:
-                        st.metric("Total", f"{int(cat_total['Grand Total']):,}")
-                    with col4:
-                        st.metric("Closure %", f"{cat_total['% Closure']:.1f}%")
-            
-            st.markdown("---")
-            
-            # ========== BATCH 3: ZONE-WISE DRILL-DOWN WITH TOGGLE ==========
-            st.subheader("🗺️ BATCH 3: Zone-wise Drill-Down (Toggle by Category & Zone)")
-            
-            # Get unique zones
-            zones = sorted(df_processed['Zone Name'].dropna().unique())
-            
-            # Create two columns for dropdown filters
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                selected_category = st.selectbox(
-                    "🏷️ Select Main Category",
-                    options=main_categories,
-                    key="batch3_category"
-                )
-            
-            with col2:
-                selected_zone = st.selectbox(
-                    "🗺️ Select Zone",
-                    options=zones,
-                    key="batch3_zone"
-                )
-            
-            # Generate zone+category summary (cached) - INSTANT TOGGLE NOW!
-            zone_summary = generate_zone_subcategory_summary(df_processed, selected_category, selected_zone)
-            
-            if not zone_summary.empty:
-                st.write(f"### {selected_category} - Zone {selected_zone} - Subcategory Breakdown")
-                
-                # Display table
-                st.dataframe(
-                    zone_summary.round(1),
-                    use_container_width=True,
-                    hide_index=False,
-                    column_config={
-                        '% Closure': st.column_config.NumberColumn(
-                            "Closure %",
-                            format="%.1f%%"
-                        )
-                    }
+            # Load enriched data (snapshot cache first, then the export itself)
+            dataset_id = dataset_id_for_upload(uploaded_files, incremental, streaming)
+            baseline_id = None
+            if baseline_date is not None:
+                baseline_id = open_history_dataset(baseline_date)
+            elif baseline_file is not None:
+                baseline_id = dataset_id_for_upload(
+                    [baseline_file], incremental, streaming, state_prefix='baseline_', auxiliary=True
                 )
-                
-                # Metrics for this zone+category combo
-                zone_total = zone_summary.iloc[-1]  # Last row is the total
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Open", f"{int(zone_total['Open']):,}")
-                with col2:
-                    st.metric("Resolved", f"{int(zone_total['Resolved']):,}")
-                with col3:
-                    st.metric("Total", f"{int(zone_total['Grand Total']):,}")
-                with col4:
-                    st.metric("Closure %", f"{zone_total['% Closure']:.1f}%")
-            else:
-                st.warning(f"⚠️ No data found for {selected_category} in Zone {selected_zone}")
-            
-            st.markdown("---")
-            
-            # ========== BATCH 4: DEPARTMENT-WISE DRILL-DOWN WITH TOGGLE ==========
-            st.subheader("🏢 BATCH 4: Department-wise Drill-Down (Toggle by Department)")
-            
-            # Get unique departments
-            departments = sorted(df_processed['Department'].unique())
-            
-            # Create dropdown filter
-            selected_department = st.selectbox(
-                "🏢 Select Department",
-                options=departments,
-                key="batch4_department"
-            )
-            
-            # Generate department+category summary (cached) - INSTANT TOGGLE NOW!
-            dept_summary = generate_department_category_summary(df_processed, selected_department)
-            
-            if not dept_summary.empty:
-                st.write(f"### {selected_department} - Main Category Breakdown")
-                
-                # Display table
-                st.dataframe(
-                    dept_summary.round(1),
-                    use_container_width=True,
-                    hide_index=False,
-                    column_config={
-                        '% Closure': st.column_config.NumberColumn(
-                            "Closure %",
-                            format="%.1f%%"
-                        )
-                    }
+            window_id = select_date_window(dataset_id) if date_window else None
+            acquire_datasets([held for held in (dataset_id, baseline_id, window_id) if held is not None])
+            # Every batch and download below summarizes the window when one is chosen
+            view_id = window_id or dataset_id
+            load_info = get_load_info(dataset_id)
+            if save_history and st.session_state.get('history_saved') != dataset_id:
+                with profile_stage('save_to_history'):
+                    st.session_state['history_saved_date'] = save_to_history(dataset_id)
+                st.session_state['history_saved'] = dataset_id
+            if save_history:
+                st.sidebar.caption(f"Stored in history as the snapshot of {st.session_state['history_saved_date']}")
+            if load_info['source'] == 'incremental':
+                st.success(
+                    f"✅ Loaded {load_info['rows']:,} records incrementally in {load_info['seconds']:.2f}s "
+                    f"({load_info['changed']:,} changed, {load_info['added']:,} new, {load_info['removed']:,} removed)"
                 )
-                
-                # Metrics for this department
-                dept_total = dept_summary.iloc[-1]  # Last row is the total
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Open", f"{int(dept_total['Open']):,}")
-                with col2:
-                    st.metric("Resolved", f"{int(dept_total['Resolved']):,}")
-                with col3:
-                    st.metric("Total", f"{int(dept_total['Grand Total']):,}")
-                with col4:
-                    st.metric("Closure %", f"{dept_total['% Closure']:.1f}%")
             else:
-                st.warning(f"⚠️ No data found for {selected_department}")
-            
-            st.markdown("---")
-            
-            # ========== BATCH 5: OFFICER PERFORMANCE TRACKING ==========
-            st.subheader("👨‍💼 BATCH 5: LMC Officer Performance - Open Ticket Tracking")
-            
-            st.markdown("**Filter by Zone OR Main Category to see officer-wise open ticket distribution**")
-            
-            # Get unique zones for LMC
-            lmc_df = df_processed[df_processed['Department'] == 'LMC']
-            zones_lmc = sorted(lmc_df['Zone Name'].dropna().unique())
-            
-            # Create tabs for different filtering views
-            perf_tab1, perf_tab2, perf_tab3 = st.tabs([
-                "📍 By Zone",
-                "🏷️ By Main Category",
-                "🎯 By Zone + Category"
-            ])
-            
-            # ========== TAB : FILTER BY ZONE + CATEGORY ==========
-            with perf_tab3:
-                st.write("### Officer Performance - Zone + Category Open Tickets")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    selected_zone_combo = st.selectbox(
-                        "🗺️ Select Zone",
-                        options=zones_lmc,
-                        key="batch5_zone_combo"
+                source_label = {
+                    'snapshot': "snapshot", 'stream': "export (streamed)", 'csv': "CSV", 'csv.gz': "gzipped CSV",
+                    'consolidated': "merged exports"
+                }.get(load_info['source'], "XLSX")
+                st.success(f"✅ Loaded {load_info['rows']:,} records from {source_label} in {load_info['seconds']:.2f}s")
+            if 'files' in load_info:
+                if 'duplicates' in load_info:
+                    st.caption(
+                        f"Merged {load_info['files']} files; {load_info['duplicates']:,} complaint(s) listed in "
+                        f"more than one file were counted once"
                     )
-                
-                with col2:
-                    selected_category_combo = st.selectbox(
-                        "🏷️ Select Main Category",
-                        options=main_categories,
-                        key="batch5_category_combo"
-                    )
-                
-                officer_perf_combo = generate_officer_performance_category_zone(
-                    df_processed, selected_category_combo, selected_zone_combo
-                )
-                
-                if not officer_perf_combo.empty:
-                    st.write(f"**Zone: {selected_zone_combo} | Category: {selected_category_combo}** | **Total Open: {officer_perf_combo['Open'].sum():,}** | **Officers: {len(officer_perf_combo)}**")
-                    
-                    st.dataframe(
-                        officer_perf_combo,
-                        use_container_width=True,
-                        hide_index=True,
-                        column_config={
-                            'Rank': st.column_config.NumberColumn("Rank", width=50),
-                            'Officer Name': st.column_config.TextColumn("Officer Name", width=250),
-                            'Open': st.column_config.NumberColumn("Open", width=80),
-                            'Resolved': st.column_config.NumberColumn("Resolved", width=80),
-                            'Total': st.column_config.NumberColumn("Total", width=80),
-                            '% Closure': st.column_config.NumberColumn("% Closure", width=100, format="%.1f%%")
-                        }
-                    )
-                    
-                    # Summary metrics
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Total Open", f"{officer_perf_combo['Open'].sum():,}")
-                    with col2:
-                        st.metric("Total Resolved", f"{officer_perf_combo['Resolved'].sum():,}")
-                    with col3:
-                        st.metric("Active Officers", len(officer_perf_combo))
-                    with col4:
-                        avg_closure = (officer_perf_combo['Resolved'].sum() / officer_perf_combo['Total'].sum() * 100) if officer_perf_combo['Total'].sum() > 0 else 0
-                        st.metric("Combo Closure %", f"{avg_closure:.1f}%")
                 else:
-                    st.warning(f"⚠️ No LMC complaints found for Zone {selected_zone_combo} in category {selected_category_combo}")
-            
-            st.markdown("---")
-            
-            # ========== DOWNLOADS ==========
-            st.subheader("📥 Download Reports")
+                    st.caption(
+                        f"Merged {load_info['files']} streamed files; complaints listed in more than one file "
+                        f"are counted once per file"
+                    )
             
-            col1, col2 = st.columns(2)
+            for name, values in dataset_unmatched(dataset_id).items():
+                with st.expander(f"⚠️ {len(values)} {RULE_COLUMNS[name]} value(s) matched no classification rule"):
+                    st.caption(
+                        f"Counted as '{CLASSIFICATION_RULES[name]['default']}'. "
+                        f"Add them to {os.path.basename(RULES_PATH)} to classify them."
+                    )
+                    st.write(values)
             
-            # Download Batch 1 (Main Category Summary)
-            with col1:
-                csv_buffer1 = io.StringIO()
-                summary_table.to_csv(csv_buffer1)
-                st.download_button(
-                    label="📥 Download Batch 1: Main Category Summary",
-                    data=csv_buffer1.getvalue(),
-                    file_name="batch1_main_category_summary.csv",
-                    mime="text/csv"
+            if window_id is not None:
+                window_info = get_load_info(window_id)
+                st.info(
+                    f"🗓️ Showing {window_info['rows']:,} of {load_info['rows']:,} complaints "
+                    f"{window_info['basis'].lower()} {window_info['start']:%d %b %Y} – {window_info['end']:%d %b %Y}"
                 )
             
-            # Download All Batch 2 (All Subcategory Summaries combined) - now cached!
-            with col2:
-                combined_sub = get_all_subcategory_summaries(df_processed, main_categories)
-                csv_buffer2 = io.StringIO()
-                combined_sub.to_csv(csv_buffer2, index=False)
-                st.download_button(
-                    label="📥 Download Batch 2: All Subcategories",
-                    data=csv_buffer2.getvalue(),
-                    file_name="batch2_all_subcategories.csv",
-                    mime="text/csv"
-                )
+            sections = []
+            if get_load_info(view_id)['rows']:
+                # Precompute every other view in the background, without holding up this page;
+                # not for a date window, which is left as soon as another window is picked
+                if window_id is None:
+                    start_warmup(view_id)
+                    done, total = warmup_progress(view_id)
+                    if done < total:
+                        with st.sidebar:
+                            render_warmup_progress(view_id)
+                
+                main_categories = sorted(get_cube(view_id)['MainCategory'].unique())
+                sections = [
+                    lambda: render_batch1(view_id),
+                    lambda: render_batch2(view_id, main_categories),
+                    lambda: render_batch3(view_id, main_categories),
+                    lambda: render_batch4(view_id),
+                    lambda: render_batch5(view_id, main_categories),
+                    lambda: render_downloads(view_id),
+                ]
+            else:
+                st.warning("No complaints fall in the selected date window")
+            if baseline_id is not None:
+                sections.insert(0, lambda: render_diff(dataset_id, baseline_id))
+            # Each section is a fragment: its widgets rerun only that section (see profiled_section)
+            for position, render in enumerate(sections):
+                if position:
+                    st.markdown("---")
+                render()
             
         except Exception as e:
             st.error(f"❌ Error processing file: {str(e)}")
             st.exception(e)
     
     else:
-        st.info("👆 Upload your XLSX file to get started")
+        acquire_datasets([])
+        st.info("👆 Upload your XLSX or CSV export to get started")
+    
+    if HISTORY_DB:
+        st.markdown("---")
+        render_history()
+    
+    if show_profile:
+        render_profile_panel()
+
+def cli(argv=None):
+    """Command-line entry point: python Lucknow.py {report,serve,history} ..."""
+    parser = argparse.ArgumentParser(prog='Lucknow.py', description="Complaints dashboard batch tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    report = commands.add_parser('report', help="Write the Batch 1-5 tables for every zone, category, department and officer")
+    report.add_argument('exports', nargs='+', help="XLSX / CSV / CSV.gz complaint exports (combined into one dataset)")
+    report.add_argument('-o', '--output', help="multi-sheet XLSX to write")
+    report.add_argument('--csv-dir', help="directory to write one CSV per sheet into")
+    report.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    report.add_argument('--streaming', action='store_true', help="low-memory mode: fold rows into counts chunk by chunk")
+    
+    serve = commands.add_parser('serve', help="Answer JSON summary queries over HTTP (/datasets, /summary, /officers)")
+    serve.add_argument('exports', nargs='+', help="XLSX / CSV / CSV.gz complaint exports (combined into one dataset)")
+    serve.add_argument('--host', default=API_HOST, help="address to listen on (default: %(default)s)")
+    serve.add_argument('--port', type=int, default=int(API_PORT or 8502), help="port to listen on (default: %(default)s)")
+    serve.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes for loading")
+    
+    history = commands.add_parser('history', help="Store exports in, and query, the SQLite history database")
+    history_commands = history.add_subparsers(dest='history_command', required=True)
+    history_add = history_commands.add_parser('add', help="Store exports as the snapshot of one day")
+    history_add.add_argument('exports', nargs='+', help="XLSX / CSV / CSV.gz complaint exports (combined into one snapshot)")
+    history_add.add_argument('--date', help="snapshot date (default: the latest Created Date, else today)")
+    history_add.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes for loading")
+    history_query = history_commands.add_parser('query', help="Drill down across stored snapshots")
+    history_query.add_argument('--by', default='date,category', help="comma-separated: date," + ','.join(API_DIMENSIONS))
+    for name in API_DIMENSIONS:
+        history_query.add_argument(f'--{name}', action='append', help=f"only this {name} (repeatable)")
+    history_query.add_argument('--from', dest='start', help="first snapshot date")
+    history_query.add_argument('--to', dest='end', help="last snapshot date")
+    history_query.add_argument('--csv', help="write the table to this CSV instead of printing it")
+    for command in (history_add, history_query):
+        command.add_argument('--db', default=HISTORY_DB or 'history.sqlite3', help="history database (default: %(default)s)")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    
+    if args.command == 'report':
+        if not args.output and not args.csv_dir:
+            args.output = 'batch_report.xlsx'
+        
+        timings = []
+        start = time.perf_counter()
+        dataset_id = load_exports(args.exports, args.workers, args.streaming)
+        timings.append(('load', time.perf_counter() - start))
+        
+        start = time.perf_counter()
+        write_report(iter_report_tables(dataset_id, args.workers), args.output, args.csv_dir)
+        timings.append(('report', time.perf_counter() - start))
+        
+        rows = get_load_info(dataset_id)['rows']
+        print(f"{rows:,} complaints from {len(args.exports)} export(s)", file=sys.stderr)
+        for name, values in dataset_unmatched(dataset_id).items():
+            print(f"  {len(values)} {RULE_COLUMNS[name]} value(s) matched no rule: {', '.join(map(str, values))}",
+                  file=sys.stderr)
+        for stage, seconds in timings:
+            print(f"  {stage:<10} {seconds:8.2f}s", file=sys.stderr)
+        for target in (args.output, args.csv_dir):
+            if target:
+                print(f"Wrote {target}", file=sys.stderr)
+    
+    elif args.command == 'history' and args.history_command == 'add':
+        dataset_id = load_exports(args.exports, args.workers)
+        snapshot_date = save_to_history(dataset_id, args.date, args.db)
+        print(f"Stored {get_load_info(dataset_id)['rows']:,} complaints as {snapshot_date} in {args.db}", file=sys.stderr)
+    
+    elif args.command == 'history':
+        dimensions = dict(date='Snapshot Date', **API_DIMENSIONS)
+        unknown = [name for name in args.by.split(',') if name not in dimensions]
+        if unknown:
+            parser.error(f"cannot group by: {', '.join(unknown)}")
+        filters = {dimensions[name]: getattr(args, name) for name in API_DIMENSIONS if getattr(args, name)}
+        dims = [dimensions[name] for name in args.by.split(',')]
+        with open_history(args.db) as conn:
+            table = history_drilldown(conn, dims, filters, args.start, args.end, total_label='TOTAL')
+        if args.csv:
+            table.to_csv(args.csv)
+        else:
+            print(table.to_string())
+    
+    elif args.command == 'serve':
+        dataset_id = load_exports(args.exports, args.workers)
+        server = http.server.ThreadingHTTPServer((args.host, args.port), make_api_handler(_dataset_registry()))
+        rows = get_load_info(dataset_id)['rows']
+        print(f"Serving {rows:,} complaints on http://{args.host}:{server.server_port}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
 
 if __name__ == "__main__":
+    if get_script_run_ctx() is None:
+        sys.exit(cli())
     main()
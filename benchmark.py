@@ -0,0 +1,250 @@
+"""Benchmark the dashboard pipeline on synthetic complaint exports.
+
+    python benchmark.py --sizes 10000,100000,1000000 --output bench.json
+    python benchmark.py --sizes 100000 --compare bench.json
+"""
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import Lucknow
+
+# Subcategories no classification rule matches, so the "Others" bucket is exercised too
+OTHER_SUBCATEGORIES = [
+    "Stray animals",
+    "Water logging",
+    "Street light not working",
+    "Illegal hoarding",
+    "Dead animal removal",
+]
+STATUS_NAMES = ["Open", "In Progress", "Reopened", "Resolved", "Resolved - Verified"]
+STATUS_WEIGHTS = [0.30, 0.15, 0.05, 0.35, 0.15]
+ZONES = [f"Zone {i}" for i in range(1, 9)]
+
+# Rows above this are not written to XLSX (Excel caps a sheet at 1,048,576 rows)
+XLSX_MAX_ROWS = 200_000
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def _assignees(officers_per_zone):
+    """Assigned User Name values: LMC officers per zone plus PWD/LDA engineers"""
+    lmc = [f"ZO {zone} - Officer {i:03d}" for zone in ZONES for i in range(1, officers_per_zone + 1)]
+    pwd = [f"PWD - JE {i:02d}" for i in range(1, 41)]
+    lda = [f"LDA - AE {i:02d}" for i in range(1, 21)]
+    return lmc, pwd, lda
+
+def generate_complaints(rows, seed=0):
+    """Synthetic complaints frame shaped like load_excel output.
+
+    Subcategories come from the main category rules plus a few unmapped ones; zones,
+    subcategories and officers follow skewed (bounded Zipf) distributions, LMC
+    officers within the complaint's zone. Roughly 15% / 10% of tickets go to
+    PWD / LDA assignees, 2% are unassigned.
+    """
+    rng = np.random.default_rng(seed)
+    with open(Lucknow.RULES_PATH) as f:
+        labels = json.load(f)['main_category']['labels']
+    subcategories = [value for values in labels.values() for value in values] + OTHER_SUBCATEGORIES
+    officers_per_zone = max(5, min(500, rows // 2000))
+    lmc, pwd, lda = _assignees(officers_per_zone)
+    assignees = lmc + pwd + lda
+
+    zones = rng.choice(len(ZONES), size=rows, p=_zipf_weights(len(ZONES), 0.7))
+    # Department first, then an officer within it, so the department mix stays fixed;
+    # LMC officers are drawn from the complaint's own zone
+    department = rng.choice(3, size=rows, p=[0.75, 0.15, 0.10])
+    offsets = np.array([0, len(lmc), len(lmc) + len(pwd)])
+    sizes = [officers_per_zone, len(pwd), len(lda)]
+    within = np.empty(rows, dtype='int64')
+    for code, size in enumerate(sizes):
+        in_department = department == code
+        within[in_department] = rng.choice(size, size=in_department.sum(), p=_zipf_weights(size))
+    assignee_codes = np.where(department == 0, zones * officers_per_zone, offsets[department]) + within
+    assignee_codes[rng.random(rows) < 0.02] = -1
+
+    created = pd.Timestamp('2026-01-01') + pd.to_timedelta(rng.integers(0, 365, size=rows), unit='D')
+    df = pd.DataFrame({
+        'Subcategory': pd.Categorical.from_codes(
+            rng.choice(len(subcategories), size=rows, p=_zipf_weights(len(subcategories), 0.8)),
+            categories=subcategories
+        ),
+        'Status Name': pd.Categorical.from_codes(
+            rng.choice(len(STATUS_NAMES), size=rows, p=STATUS_WEIGHTS), categories=STATUS_NAMES
+        ),
+        'Assigned User Name': pd.Categorical.from_codes(assignee_codes, categories=assignees),
+        'Zone Name': pd.Categorical.from_codes(zones, categories=ZONES),
+        Lucknow.COMPLAINT_ID_COLUMN: 'LKO' + pd.Series(np.arange(rows)).astype(str).str.zfill(8),
+        'Created Date': created,
+    })
+    return df
+
+def next_export(df, churn=0.01, seed=0):
+    """The next day's cumulative export of df: churn of its complaints resolved, as many dropped and added"""
+    rng = np.random.default_rng(seed + 1)
+    count = max(1, int(len(df) * churn))
+    following = df.copy()
+    following.iloc[rng.choice(len(df), count, replace=False), following.columns.get_loc('Status Name')] = 'Resolved'
+    added = generate_complaints(count, seed + 1)
+    added[Lucknow.COMPLAINT_ID_COLUMN] = 'NEW' + added[Lucknow.COMPLAINT_ID_COLUMN]
+    return Lucknow.concat_complaints([following.iloc[count:], added])
+
+def to_xlsx_bytes(df):
+    """Serialize a frame to XLSX bytes with openpyxl's write-only mode"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False):
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def reset_caches():
+    """Drop cached results and the views built on registered datasets, so the next call starts cold"""
+    Lucknow.clear_cached_results()
+    for entry in Lucknow._dataset_registry().values():
+        entry.pop('leaderboards', None)
+        entry.pop('daily', None)
+
+def measure(func, memory=False):
+    """(result, seconds, peak_bytes) of one call; peak is measured in a second traced run.
+
+    Caches are reset before each run, so cached stages (the loaders, every generate_*,
+    the officer leaderboards and the exports built from them) do their full work.
+    """
+    reset_caches()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        reset_caches()
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def summary_calls(dataset_id):
+    """(name, callable) for every generate_* call a full click-through of the dashboard makes"""
+    cube = Lucknow.get_cube(dataset_id)
+    categories = sorted(cube['MainCategory'].unique())
+    zones = sorted(cube['Zone Name'].dropna().unique())
+    departments = sorted(cube['Department'].unique())
+
+    def each(func, combos):
+        return lambda: [func(dataset_id, *combo) for combo in combos]
+
+    return [
+        ('generate_status_summary', each(Lucknow.generate_status_summary, [()])),
+        ('generate_subcategory_summary', each(Lucknow.generate_subcategory_summary, [(c,) for c in categories])),
+        ('generate_zone_subcategory_summary',
+         each(Lucknow.generate_zone_subcategory_summary, [(c, z) for c in categories for z in zones])),
+        ('generate_department_category_summary',
+         each(Lucknow.generate_department_category_summary, [(d,) for d in departments])),
+        ('generate_officer_performance_by_category',
+         each(Lucknow.generate_officer_performance_by_category, [(c,) for c in categories])),
+        ('generate_officer_performance_by_zone',
+         each(Lucknow.generate_officer_performance_by_zone, [(z,) for z in zones])),
+        ('generate_officer_performance_category_zone',
+         each(Lucknow.generate_officer_performance_category_zone, [(c, z) for c in categories for z in zones])),
+    ]
+
+def run_size(rows, memory=False, seed=0):
+    """Benchmark every pipeline stage on one synthetic export; returns a list of result records"""
+    results = []
+
+    def record(stage, func):
+        value, seconds, peak = measure(func, memory)
+        results.append({'rows': rows, 'stage': stage, 'seconds': round(seconds, 6), 'peak_bytes': peak})
+        print(f"{rows:>10,}  {stage:<44} {seconds:9.3f}s" + (f"  {peak / 2**20:9.1f} MiB" if peak is not None else ""),
+              file=sys.stderr)
+        return value
+
+    raw = generate_complaints(rows, seed)
+
+    if rows <= XLSX_MAX_ROWS:
+        xlsx = to_xlsx_bytes(raw)
+        record('load_excel', lambda: Lucknow.load_excel(xlsx))
+    csv = raw.to_csv(index=False).encode()
+    record('load_csv', lambda: Lucknow.load_csv(csv))
+
+    df = record('enrich_complaints', lambda: Lucknow.enrich_complaints(raw.copy()))
+    cube = record('build_cube', lambda: Lucknow.build_cube(df))
+    # A day's update with 1% churn: patched onto the previous snapshot, and rebuilt from scratch
+    following = next_export(raw, seed=seed)
+    record('merge_incremental', lambda: Lucknow.merge_incremental(df, cube, following.copy()))
+    record('rebuild_next_export', lambda: Lucknow.build_cube(Lucknow.enrich_complaints(following.copy())))
+
+    dataset_id = f"benchmark-{rows}-{seed}"
+    Lucknow.register_dataset(dataset_id, cube, {'source': 'benchmark', 'seconds': 0.0, 'rows': rows})
+    for name, call in summary_calls(dataset_id):
+        record(name, call)
+
+    record('export_xlsx', lambda: Lucknow.write_report_xlsx(Lucknow.iter_report_tables(dataset_id), io.BytesIO()))
+    record('export_zip', lambda: Lucknow.write_report_zip(Lucknow.iter_report_tables(dataset_id), io.BytesIO()))
+    return results
+
+def compare(results, baseline_path, threshold):
+    """Print stages slower than the baseline by more than threshold; returns the regression count"""
+    with open(baseline_path) as f:
+        baseline = {(r['rows'], r['stage']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    for result in results:
+        before = baseline.get((result['rows'], result['stage']))
+        if not before or before['seconds'] <= 0:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        if ratio > 1 + threshold:
+            regressions += 1
+            print(f"REGRESSION {result['rows']:,} {result['stage']}: "
+                  f"{before['seconds']:.3f}s -> {result['seconds']:.3f}s ({ratio:.2f}x)", file=sys.stderr)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the complaints dashboard pipeline")
+    parser.add_argument('--sizes', default='10000,100000,1000000,5000000',
+                        help="comma-separated row counts (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true', help="also record tracemalloc peak per stage")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON results file")
+    parser.add_argument('--compare', help="previous results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="slowdown ratio counted as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in (int(size) for size in args.sizes.split(',')):
+        results.extend(run_size(rows, args.memory, args.seed))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
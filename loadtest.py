@@ -0,0 +1,248 @@
+"""Load-test the dashboard with concurrent simulated sessions.
+
+    python loadtest.py --rows 100000 --sessions 1,4,16 --output loadtest.json
+    python loadtest.py --rows 100000 --sessions 1,4,16 --compare loadtest.json
+
+Every session is an in-process AppTest of Lucknow.py, run in its own thread like the
+sessions of one server process. Each uploads the same synthetic export and then
+changes the Batch 3, 4 and 5 selectboxes (and the Batch 5 view) in random order.
+Caches and snapshots are cleared between concurrency levels, so every level starts cold.
+
+A "rerun" latency is a full-page rerun: AppTest reruns the whole script after a widget
+change, even one inside a fragment, where a browser session reruns only that fragment.
+They are an upper bound on what a user waits for after a change.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR = tempfile.mkdtemp(prefix='lucknow-loadtest-')
+# Before Lucknow is imported, so the test never touches the real snapshot cache
+os.environ['LUCKNOW_SNAPSHOT_DIR'] = SNAPSHOT_DIR
+
+import streamlit as st
+from streamlit.runtime.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+
+import benchmark
+import Lucknow
+
+# Widgets a session picks from at random; only those on the page at that moment are used
+WIDGET_KEYS = [
+    'batch3_category', 'batch3_zone',
+    'batch4_department',
+    'batch5_view', 'batch5_top_k', 'batch5_zone', 'batch5_category', 'batch5_zone_combo', 'batch5_category_combo',
+]
+# Option values of widgets that display them through a format_func (AppTest lists the labels)
+WIDGET_OPTIONS = {'batch5_top_k': Lucknow.LEADERBOARD_TOP_K}
+PERCENTILES = [50, 95, 99]
+# What the 'rerun' stage measures, printed with the results and stored in their metadata
+RERUN_NOTE = "rerun = full-page AppTest rerun after a widget change (fragments are not rerun on their own)"
+
+def share_runtime():
+    """Let AppTests run side by side in threads.
+
+    AppTest installs a mock Runtime as the process-wide singleton for the length of
+    every run and removes it afterwards, so a run finishing in one thread would pull
+    the runtime out from under the others. The latest mock is kept for all of them.
+    """
+    latest = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            latest[:] = [cls._instance]
+        if not latest:
+            raise RuntimeError("Runtime hasn't been created!")
+        return latest[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(latest))
+
+# AppTest script: the dashboard with every uploader returning the synthetic export
+DASHBOARD_SCRIPT = """
+import io
+import os
+
+import streamlit as st
+
+import Lucknow
+
+EXPORT_PATH = {export_path!r}
+
+class Upload(io.BytesIO):
+    name = os.path.basename(EXPORT_PATH)
+    file_id = EXPORT_PATH
+
+# AppTest cannot drive a file uploader
+with open(EXPORT_PATH, 'rb') as f:
+    export = f.read()
+st.file_uploader = lambda *args, **kwargs: [Upload(export)]
+# Nor follow a run_every fragment; the cache warm-up itself still runs
+Lucknow.render_warmup_progress = lambda dataset_id: None
+Lucknow.main()
+"""
+
+def timed_run(run):
+    """Seconds one AppTest rerun takes"""
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+def run_session(script_path, steps, seed, timeout, latencies):
+    """One simulated user: upload, then steps random widget changes; appends (stage, seconds)"""
+    rng = random.Random(seed)
+    app = AppTest.from_file(script_path, default_timeout=timeout)
+    latencies.append(('upload', timed_run(app.run)))
+    if app.exception:
+        raise RuntimeError(f"Dashboard failed on upload: {app.exception[0].message}")
+
+    for _ in range(steps):
+        present = {widget.key: widget for widget in list(app.selectbox) + list(app.radio) if widget.key in WIDGET_KEYS}
+        if not present:
+            raise RuntimeError("No Batch 3-5 widgets on the page")
+        widget = present[rng.choice(sorted(present))]
+        options = WIDGET_OPTIONS.get(widget.key, widget.options)
+        widget.set_value(rng.choice([option for option in options if option != widget.value] or options))
+        latencies.append(('rerun', timed_run(app.run)))
+        if app.exception:
+            raise RuntimeError(f"Dashboard failed after changing {widget.key}: {app.exception[0].message}")
+
+def sample_peak_rss(stop, peak, interval=0.05):
+    """Track the peak resident set size of this process until stop is set"""
+    while not stop.is_set():
+        rss = Lucknow.current_rss_bytes()
+        if rss is not None and rss > peak[0]:
+            peak[0] = rss
+        stop.wait(interval)
+
+def reset_state():
+    """Drop cached results, datasets and snapshots so the next level starts cold"""
+    # The warm-up pool is a cached resource too: clearing the cache alone would leave its
+    # queued tasks running into the next level, against the registry that replaced theirs
+    Lucknow._warmup_executor().shutdown(wait=True, cancel_futures=True)
+    st.cache_resource.clear()
+    Lucknow._HEADLESS_REGISTRY.clear()
+    shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+
+def run_level(script_path, sessions, steps, seed, timeout):
+    """Run sessions concurrent users; returns one result record per stage"""
+    reset_state()
+    latencies = []
+    errors = []
+
+    def user(index):
+        try:
+            run_session(script_path, steps, seed * 1000 + index, timeout, latencies)
+        except Exception as error:
+            errors.append(error)
+
+    stop = threading.Event()
+    peak = [Lucknow.current_rss_bytes() or 0]
+    sampler = threading.Thread(target=sample_peak_rss, args=(stop, peak), daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    if errors:
+        raise errors[0]
+
+    results = []
+    for stage in ('upload', 'rerun'):
+        seconds = np.array([value for name, value in latencies if name == stage])
+        record = {'sessions': sessions, 'stage': stage, 'count': len(seconds)}
+        for percentile, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+            record[f'p{percentile}'] = round(float(value), 6)
+        record.update({'max': round(float(seconds.max()), 6), 'wall': round(wall, 3), 'peak_rss_bytes': peak[0]})
+        results.append(record)
+        print(f"{sessions:>5} sessions  {stage:<7} n={len(seconds):<5} " +
+              "  ".join(f"p{p}={record[f'p{p}']:.3f}s" for p in PERCENTILES) +
+              f"  peak RSS {peak[0] / 2**20:.0f} MiB", file=sys.stderr)
+    return results
+
+def compare(results, baseline_path, threshold):
+    """Print levels whose p95 rose above the baseline by more than threshold; returns the regression count"""
+    with open(baseline_path) as f:
+        baseline = {(r['sessions'], r['stage']): r for r in json.load(f)['results']}
+
+    regressions = 0
+    for result in results:
+        before = baseline.get((result['sessions'], result['stage']))
+        if not before or before['p95'] <= 0:
+            continue
+        ratio = result['p95'] / before['p95']
+        if ratio > 1 + threshold:
+            regressions += 1
+            print(f"REGRESSION {result['sessions']} sessions {result['stage']} p95: "
+                  f"{before['p95']:.3f}s -> {result['p95']:.3f}s ({ratio:.2f}x)", file=sys.stderr)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the complaints dashboard with concurrent sessions")
+    parser.add_argument('--rows', type=int, default=100_000, help="rows in the synthetic export (default: %(default)s)")
+    parser.add_argument('--sessions', default='1,2,4,8',
+                        help="comma-separated concurrency levels (default: %(default)s)")
+    parser.add_argument('--steps', type=int, default=20, help="widget changes per session (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120, help="seconds one rerun may take (default: %(default)s)")
+    parser.add_argument('--output', default='loadtest_results.json', help="JSON results file")
+    parser.add_argument('--compare', help="previous results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="p95 slowdown ratio counted as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    share_runtime()
+    export_dir = tempfile.mkdtemp(prefix='lucknow-loadtest-export-')
+    export_path = os.path.join(export_dir, 'complaints.csv')
+    benchmark.generate_complaints(args.rows, args.seed).to_csv(export_path, index=False)
+    # One script file for every session: AppTest keys its page registry by script path
+    script_path = os.path.join(export_dir, 'dashboard.py')
+    with open(script_path, 'w') as f:
+        f.write(DASHBOARD_SCRIPT.format(export_path=export_path))
+
+    print(RERUN_NOTE, file=sys.stderr)
+    results = []
+    try:
+        for sessions in (int(level) for level in args.sessions.split(',')):
+            results.extend(run_level(script_path, sessions, args.steps, args.seed, args.timeout))
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+        shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'streamlit': st.__version__,
+                'cpus': os.cpu_count(),
+                'rows': args.rows,
+                'steps': args.steps,
+                'rerun': RERUN_NOTE,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
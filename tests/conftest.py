@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Before Lucknow is imported, so the tests never touch the real snapshot cache
+os.environ['LUCKNOW_SNAPSHOT_DIR'] = tempfile.mkdtemp(prefix='lucknow-tests-')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
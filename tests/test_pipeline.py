@@ -0,0 +1,200 @@
+"""Checks of the cube pipeline against straightforward row-level computations."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmark
+import Lucknow
+
+ROWS = 5000
+
+@pytest.fixture(scope='module')
+def raw():
+    df = benchmark.generate_complaints(ROWS, seed=7)
+    # A few complaints without a zone, which every view must still count
+    df.loc[df.sample(50, random_state=1).index, 'Zone Name'] = np.nan
+    return df
+
+@pytest.fixture(scope='module')
+def enriched(raw):
+    return Lucknow.enrich_complaints(raw.copy())
+
+@pytest.fixture(scope='module')
+def cube(enriched):
+    return Lucknow.compact_cube(Lucknow.build_cube(enriched))
+
+def normalized_cube(cube):
+    """A cube as a Count series keyed by plain values, without empty cells, for comparison"""
+    keys = cube[Lucknow.CUBE_DIMENSIONS].astype(object)
+    keys = keys.where(keys.notna(), '<missing>')
+    counts = pd.Series(cube['Count'].astype('int64').to_numpy(), index=pd.MultiIndex.from_frame(keys))
+    counts = counts.groupby(level=list(range(len(Lucknow.CUBE_DIMENSIONS)))).sum()
+    return counts[counts != 0].sort_index()
+
+def status_counts(rows, dims):
+    """Open / Resolved per group of complaint rows, the way the dashboard first computed them"""
+    counts = rows.groupby(dims + ['StatusBinary'], observed=True).size().unstack(fill_value=0)
+    return counts.reindex(columns=Lucknow.STATUS_COLUMNS, fill_value=0)
+
+def closure(counts, total_column='Total'):
+    counts = counts.copy()
+    counts[total_column] = counts['Open'] + counts['Resolved']
+    counts['% Closure'] = (counts['Resolved'] / counts[total_column] * 100).fillna(0).round(1)
+    return counts
+
+def assert_same_table(got, expected):
+    got = got.reset_index(drop=True).astype(object)
+    expected = expected.reset_index(drop=True).astype(object)
+    got.columns = expected.columns = [str(col) for col in expected.columns]
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+# ========== CLASSIFICATION RULES ==========
+RULES_SPEC = {
+    'default': 'Others',
+    'labels': {'Sanitation': ['Garbage dumped on public land', 'Overflowing  Dustbin'], 'Roads': ['Pothole']},
+    'aliases': {'Potholes': 'pothole'},
+    'prefixes': {'ZO ': 'LMC', 'ZO Zone 9': 'Outside', 'PWD': 'PWD'},
+}
+
+def test_rules_match_normalized_values_aliases_and_longest_prefixes():
+    rules = Lucknow.compile_rules(RULES_SPEC)
+    assert Lucknow.classify(rules, '  overflowing dustbin ') == 'Sanitation'
+    assert Lucknow.classify(rules, 'GARBAGE DUMPED  ON PUBLIC LAND') == 'Sanitation'
+    assert Lucknow.classify(rules, 'potholes') == 'Roads'
+    assert Lucknow.classify(rules, 'zo zone 9 - officer 001') == 'Outside'
+    assert Lucknow.classify(rules, 'ZO Zone 1 - Officer 001') == 'LMC'
+    assert Lucknow.classify(rules, 'Stray animals') == 'Others'
+    assert Lucknow.unmatched_values(rules, ['Stray animals', 'Pothole', None, 'stray animals']) == [
+        'Stray animals', 'stray animals'
+    ]
+    assert rules['labels'] == ['LMC', 'Others', 'Outside', 'PWD', 'Roads', 'Sanitation']
+
+@pytest.mark.parametrize('spec', [
+    dict(RULES_SPEC, labels={'Sanitation': ['Pothole'], 'Roads': ['pothole ']}),
+    dict(RULES_SPEC, aliases={'Potholes': 'Sinkhole'}),
+])
+def test_rules_reject_conflicting_values_and_unknown_aliases(spec):
+    with pytest.raises(ValueError):
+        Lucknow.compile_rules(spec)
+
+def test_rules_fingerprint_follows_the_config(tmp_path):
+    path = tmp_path / 'rules.json'
+    spec = {'main_category': RULES_SPEC, 'department': dict(RULES_SPEC, labels={}, aliases={})}
+    path.write_text(json.dumps(spec))
+    rules, fingerprint = Lucknow.load_rules(str(path))
+    assert rules['department']['labels'] == ['LMC', 'Others', 'Outside', 'PWD']
+    path.write_text(json.dumps(spec, indent=2))
+    assert Lucknow.load_rules(str(path))[1] != fingerprint
+    path.write_text(json.dumps({'main_category': RULES_SPEC}))
+    with pytest.raises(ValueError):
+        Lucknow.load_rules(str(path))
+
+# ========== INCREMENTAL MERGE ==========
+def test_incremental_cube_equals_full_rebuild(raw):
+    rng = np.random.default_rng(3)
+    prev = raw.iloc[:4000].copy()
+    new = raw.iloc[500:].copy()
+    # Re-status some of the complaints both exports list, so rows change as well as appear and go
+    changed = new.index[:3500][rng.random(3500) < 0.2]
+    new.loc[changed, 'Status Name'] = 'Resolved'
+    new = new.reset_index(drop=True)
+
+    prev_df = Lucknow.enrich_complaints(prev.reset_index(drop=True))
+    prev_cube = Lucknow.build_cube(prev_df)
+    df, merged, stats = Lucknow.merge_incremental(prev_df, prev_cube, new.copy())
+
+    rebuilt = Lucknow.build_cube(Lucknow.enrich_complaints(new.copy()))
+    pd.testing.assert_series_equal(normalized_cube(merged), normalized_cube(rebuilt))
+    assert len(df) == len(new)
+    assert stats['added'] == 1000 and stats['removed'] == 500
+
+def test_changed_values_treats_missing_as_equal_and_new_values_as_changed():
+    old = pd.Series(['a', None, 'b', 'a'], dtype='category')
+    new = pd.Series(['a', None, 'c', None], dtype='category')
+    assert Lucknow.changed_values(old, new).tolist() == [False, False, True, True]
+    old_dates = pd.to_datetime(pd.Series(['2026-01-01', None, '2026-01-02']))
+    new_dates = pd.to_datetime(pd.Series(['2026-01-01', None, '2026-01-03']))
+    assert Lucknow.changed_values(old_dates, new_dates).tolist() == [False, False, True]
+
+# ========== DRILL-DOWNS ==========
+def test_status_summary_matches_row_counts(enriched, cube):
+    expected = closure(status_counts(enriched, ['MainCategory']), 'Grand Total')
+    got = Lucknow.drilldown(cube, ['MainCategory'], total_column='Grand Total')
+    assert_same_table(got.reset_index(), expected.reset_index())
+
+def test_filtered_drilldown_matches_row_counts(enriched, cube):
+    rows = enriched[(enriched['MainCategory'] == 'Sanitation') & (enriched['Zone Name'] == 'Zone 1')]
+    expected = closure(status_counts(rows, ['Subcategory']))
+    got = Lucknow.drilldown(cube, ['Subcategory'], {'MainCategory': 'Sanitation', 'Zone Name': 'Zone 1'})
+    assert_same_table(got.reset_index(), expected.reset_index())
+
+def test_subtotals_follow_each_group(enriched, cube):
+    dims = ['Zone Name', 'Department', 'MainCategory']
+    rows = enriched[enriched['Zone Name'].notna()]
+
+    def expected_rows(rows, depth):
+        # Every group's rows, then (above the last level) a subtotal of the group
+        table = []
+        for value, group in rows.groupby(dims[depth], observed=True):
+            if depth == len(dims) - 1:
+                counts = group['StatusBinary'].value_counts()
+                table.append([value, counts.get('Open', 0), counts.get('Resolved', 0)])
+                continue
+            for row in expected_rows(group, depth + 1):
+                table.append([value] + row)
+            counts = group['StatusBinary'].value_counts()
+            table.append([value] + [Lucknow.SUBTOTAL_LABEL] * (len(dims) - depth - 1)
+                         + [counts.get('Open', 0), counts.get('Resolved', 0)])
+        return table
+
+    expected = closure(pd.DataFrame(expected_rows(rows, 0), columns=dims + Lucknow.STATUS_COLUMNS))
+    got = Lucknow.drilldown(cube, dims, {'Zone Name': sorted(rows['Zone Name'].unique())}, subtotals=True)
+    assert_same_table(got.reset_index(), expected)
+
+# ========== OFFICER LEADERBOARDS ==========
+def officer_table(rows):
+    """Ranked LMC officers of complaint rows: most open first, ties in officer order"""
+    counts = status_counts(rows[rows['Department'] == 'LMC'], ['Assigned User Name'])
+    counts = closure(counts).sort_values('Open', ascending=False, kind='stable').reset_index()
+    counts.insert(0, 'Rank', range(1, len(counts) + 1))
+    return counts.rename(columns={'Assigned User Name': 'Officer Name'})[Lucknow.OFFICER_COLUMNS]
+
+@pytest.mark.parametrize('zone, main_category', [
+    ('Zone 1', None), ('Zone 8', None), (None, 'Sanitation'), (None, 'Others'), ('Zone 2', 'Engineering'),
+])
+def test_leaderboards_match_row_rankings(enriched, cube, zone, main_category):
+    rows = enriched
+    if zone is not None:
+        rows = rows[rows['Zone Name'] == zone]
+    if main_category is not None:
+        rows = rows[rows['MainCategory'] == main_category]
+    board = Lucknow.build_leaderboards(cube).get((zone, main_category))
+    assert_same_table(board, officer_table(rows))
+
+# ========== DATE WINDOWS ==========
+@pytest.mark.parametrize('start, end', [
+    ('2026-03-01', '2026-03-31'), ('2026-06-15', '2026-06-15'), ('2025-01-01', '2027-01-01'), ('2025-01-01', '2025-12-31'),
+])
+def test_window_cube_matches_rows_in_the_window(enriched, start, end):
+    rows = enriched.copy()
+    # Complaints without a date fall in no window
+    rows.loc[rows.index[:100], 'Created Date'] = pd.NaT
+    daily = Lucknow.build_daily_cube(rows, 'Created Date')
+    days = rows['Created Date'].dt.normalize()
+    in_window = rows[(days >= pd.Timestamp(start)) & (days <= pd.Timestamp(end))]
+    got = Lucknow.window_cube(daily, pd.Timestamp(start).date(), pd.Timestamp(end).date())
+    if in_window.empty:
+        assert got.empty
+    else:
+        pd.testing.assert_series_equal(normalized_cube(got), normalized_cube(Lucknow.build_cube(in_window)))
+
+# ========== EXPORT FORMATS ==========
+def test_csv_and_xlsx_exports_parse_to_the_same_frame(raw):
+    export = raw.iloc[:1000].astype({'Subcategory': object})
+    # Text pandas would read as missing by default stays text, as in the XLSX
+    export.iloc[0, export.columns.get_loc('Subcategory')] = 'N/A'
+    from_xlsx, _ = Lucknow.load_excel(benchmark.to_xlsx_bytes(export))
+    from_csv, _ = Lucknow.load_csv(export.to_csv(index=False).encode())
+    pd.testing.assert_frame_equal(from_csv, from_xlsx)
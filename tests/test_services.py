@@ -0,0 +1,131 @@
+"""Checks of the services around the cube: the shared result cache, the JSON API and the history store."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmark
+import Lucknow
+
+@pytest.fixture(scope='module')
+def cube():
+    df = Lucknow.enrich_complaints(benchmark.generate_complaints(2000, seed=5))
+    return Lucknow.compact_cube(Lucknow.build_cube(df))
+
+def cache_counters(func):
+    return Lucknow.result_cache_stats().loc[func.__qualname__, Lucknow.RESULT_CACHE_COUNTERS].to_dict()
+
+# ========== RESULT CACHE ==========
+def test_result_cache_counts_hits_misses_and_evictions():
+    calls = []
+
+    @Lucknow.profiled_cache(max_entries=2)
+    def square(x):
+        calls.append(x)
+        return pd.DataFrame({'square': [x * x]})
+
+    square.clear()
+    assert square(2)['square'].iloc[0] == 4
+    square(2)
+    square(3)
+    square(4)  # a third entry evicts the least recently used one, 2
+    square(2)
+    assert calls == [2, 3, 4, 2]
+    assert cache_counters(square) == {'hits': 1, 'misses': 4, 'evictions': 2, 'expirations': 0}
+
+def test_result_cache_expires_entries_after_their_ttl():
+    calls = []
+
+    @Lucknow.profiled_cache(ttl=0)
+    def stamp(x):
+        calls.append(x)
+        return [x]
+
+    stamp.clear()
+    stamp(1)
+    stamp(1)
+    assert calls == [1, 1]
+    assert cache_counters(stamp) == {'hits': 0, 'misses': 2, 'evictions': 0, 'expirations': 1}
+
+def test_cached_results_are_handed_out_as_copies():
+    @Lucknow.profiled_cache
+    def table():
+        return pd.DataFrame({'count': [1, 2]})
+
+    table.clear()
+    table()['count'] = 0
+    assert table()['count'].tolist() == [1, 2]
+
+# ========== JSON API ==========
+@pytest.fixture
+def registry(cube):
+    return {'export-a': {'cube': cube, 'info': {'rows': int(cube['Count'].sum()), 'source': 'csv'}}}
+
+def test_api_answers_304_to_a_matching_etag(registry):
+    status, etag, payload = Lucknow.api_response(registry, '/summary', {'by': ['zone']})
+    assert status == 200 and payload['dataset'] == 'export-a'
+    assert Lucknow.api_response(registry, '/summary', {'by': ['zone']}, etag) == (304, etag, None)
+    assert Lucknow.api_response(registry, '/summary', {'by': ['zone']}, '*')[0] == 304
+    assert Lucknow.api_response(registry, '/summary', {'by': ['zone']}, '"stale"')[0] == 200
+
+def test_api_etag_changes_with_query_dataset_and_rules(registry, monkeypatch):
+    etag = Lucknow.api_response(registry, '/summary', {'by': ['zone'], 'category': ['Sanitation']})[1]
+    # Parameter order does not matter, their values do
+    assert Lucknow.api_response(registry, '/summary', {'category': ['Sanitation'], 'by': ['zone']})[1] == etag
+    assert Lucknow.api_response(registry, '/summary', {'by': ['zone'], 'category': ['Others']})[1] != etag
+    registry['export-b'] = registry['export-a']
+    assert Lucknow.api_response(registry, '/summary', {'by': ['zone'], 'category': ['Sanitation']})[1] != etag
+    del registry['export-b']
+    monkeypatch.setattr(Lucknow, 'RULES_FINGERPRINT', 'edited-rules')
+    assert Lucknow.api_response(registry, '/summary', {'by': ['zone'], 'category': ['Sanitation']})[1] != etag
+
+@pytest.mark.parametrize('params', [
+    {'zone': ['Zone 1'], 'top': ['0']},
+    {'zone': ['Zone 1'], 'top': ['many']},
+    {'zone': ['Zone 1'], 'department': ['LMC']},
+    {'zone': ['Zone 1', 'Zone 2']},
+    {'top': ['3']},
+])
+def test_api_officers_rejects_queries_it_cannot_answer(registry, params):
+    status, etag, payload = Lucknow.api_response(registry, '/officers', params)
+    assert status == 400 and etag is None and 'error' in payload
+
+def test_api_officers_returns_the_top_officers(registry):
+    status, _, payload = Lucknow.api_response(registry, '/officers', {'zone': ['Zone 1'], 'top': ['3']})
+    assert status == 200
+    assert [row['Rank'] for row in payload['rows']] == [1, 2, 3]
+
+# ========== HISTORY STORE ==========
+@pytest.fixture
+def history(tmp_path):
+    """A history store with two cumulative exports: 1,500 complaints, then those and 500 more"""
+    df = Lucknow.enrich_complaints(benchmark.generate_complaints(2000, seed=9))
+    cubes = {'2026-03-01': Lucknow.build_cube(df.iloc[:1500]), '2026-03-02': Lucknow.build_cube(df)}
+    path = str(tmp_path / 'history.sqlite3')
+    with Lucknow.open_history(path) as conn:
+        for day, day_cube in cubes.items():
+            Lucknow.store_history(conn, day, f'export-{day}', day_cube, int(day_cube['Count'].sum()))
+    with Lucknow.open_history(path) as conn:
+        yield conn, cubes
+
+def same_counts(got, expected):
+    assert got.index.astype(str).tolist() == expected.index.astype(str).tolist()
+    np.testing.assert_array_equal(got[Lucknow.STATUS_COLUMNS].to_numpy(), expected[Lucknow.STATUS_COLUMNS].to_numpy())
+
+def test_history_counts_only_the_latest_snapshot_in_the_range(history):
+    conn, cubes = history
+    got = Lucknow.history_drilldown(conn, ['MainCategory'], total_label='TOTAL')
+    same_counts(got, Lucknow.drilldown(cubes['2026-03-02'], ['MainCategory'], total_label='TOTAL'))
+    got = Lucknow.history_drilldown(conn, ['MainCategory'], end='2026-03-01')
+    same_counts(got, Lucknow.drilldown(cubes['2026-03-01'], ['MainCategory']))
+    got = Lucknow.history_drilldown(conn, ['Zone Name'], {'Snapshot Date': ['2026-03-01'], 'MainCategory': 'Sanitation'})
+    same_counts(got, Lucknow.drilldown(cubes['2026-03-01'], ['Zone Name'], {'MainCategory': 'Sanitation'}))
+
+def test_history_by_date_has_no_total_across_dates(history):
+    conn, cubes = history
+    got = Lucknow.history_drilldown(conn, ['Snapshot Date'], total_label='TOTAL')
+    assert got.index.tolist() == list(cubes)
+    assert got['Total'].tolist() == [int(day_cube['Count'].sum()) for day_cube in cubes.values()]
+    # One date has a total of its own
+    assert 'TOTAL' in Lucknow.history_drilldown(conn, ['Snapshot Date'], start='2026-03-02', total_label='TOTAL').index
+    with pytest.raises(ValueError):
+        Lucknow.history_drilldown(conn, ['MainCategory', 'Snapshot Date'], subtotals=True)